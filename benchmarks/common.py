@@ -0,0 +1,106 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run in-process against ``create_app()`` with a scratch SQLite database,
+so they never touch ``var/donman.sqlite3``.
+"""
+import contextlib
+import pathlib
+import statistics
+import time
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from donman.controller import create_app
+from donman.model import db, Staff
+from donman.seed import seed_database
+
+ADMIN_EMAIL = "bench@example.com"
+ADMIN_PASSWORD = "bench"
+
+
+def make_app(db_path, **config):
+    """Create an app bound to a scratch SQLite file and create its tables."""
+    db_path = pathlib.Path(db_path)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(db_path),
+        'METRICS_DIR': db_path.with_suffix('.metrics'),
+        **config,
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def login(app):
+    """Return a test client logged in as the benchmark staff member."""
+    client = app.test_client()
+    response = client.post('/api/staff/login', json={
+        'staff_email': ADMIN_EMAIL, 'staff_password': ADMIN_PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def seed(app, donations, donors=1000, types=10, subtypes_per_type=5, distributions=None,
+         random_seed=0):
+    """
+    Fill the scratch database with the benchmark staff member and synthetic rows.
+
+    See donman.seed.seed_database; distributions default to a quarter of the
+    donation count.
+    """
+    with app.app_context():
+        db.session.add(Staff(staff_email=ADMIN_EMAIL, staff_name="bench",
+                             staff_password_hashed=generate_password_hash(
+                                 ADMIN_PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])))
+        db.session.commit()
+        seed_database(donors=donors, donations=donations, distributions=distributions, types=types,
+                      subtypes_per_type=subtypes_per_type, staff=1, random_seed=random_seed)
+
+
+@contextlib.contextmanager
+def capture_statements(app):
+    """Collect (statement, parameters) of every SQL statement run inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(app, statement, parameters):
+    """Return the EXPLAIN QUERY PLAN lines of a captured statement."""
+    with app.app_context():
+        with db.engine.connect() as conn:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return [row[-1] for row in rows]
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (nearest rank)."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_calls(fn, repeat):
+    """Call fn repeat times and return latency statistics in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+    }
@@ -0,0 +1,61 @@
+"""Measure bulk donor import throughput.
+
+Imports a synthetic CRM extract into a scratch database three times: into an empty
+table (all inserts), unchanged (all no-op upserts), and with a share of renamed
+donors and new ones mixed in. Reports donors per second for each pass.
+
+    python benchmarks/donor_import.py --donors 200000
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app  # noqa: E402
+from donman.donor_import import import_donors  # noqa: E402
+
+
+def extract(count, renamed=0.0, new=0.0):
+    """Build a list of donor records; emails use mixed case to exercise normalisation."""
+    records = [{'donor_name': f'Donor {i}', 'donor_email': f'Donor{i}@Example.org'} for i in range(count)]
+    for i in range(int(count * renamed)):
+        records[i * int(1 / renamed)]['donor_name'] += ' (renamed)'
+    records.extend({'donor_name': f'New donor {i}', 'donor_email': f'new{i}@example.org'}
+                   for i in range(int(count * new)))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=200000)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    passes = {
+        'initial': extract(args.donors),
+        'unchanged': extract(args.donors),
+        'mixed': extract(args.donors, renamed=0.1, new=0.1),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'import.sqlite3')
+        with app.app_context():
+            for name, records in passes.items():
+                start = time.perf_counter()
+                counts, _ = import_donors(records)
+                elapsed = time.perf_counter() - start
+                results[name] = {**counts, 'seconds': elapsed, 'donors_per_second': len(records) / elapsed}
+
+    for name, result in results.items():
+        print(f"{name:10} {result['donors_per_second']:10.0f} donors/s  "
+              f"{result['inserted']} inserted, {result['updated']} updated, {result['unchanged']} unchanged")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measure /api/donor/search latency on a large donor table.
+
+Fills a scratch database with many donors with realistic names and emails (the seed
+command names every donor "Donor <i>") and times the full-text search endpoint for a
+few typical intake-desk queries, next to a LIKE '%...%' scan of the donor table (what
+searching without the index would cost).
+
+    python benchmarks/donor_search.py --donors 1000000 --repeat 50
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app, time_calls  # noqa: E402
+from donman.model import db, Donor  # noqa: E402
+
+FIRST_NAMES = ('james mary john patricia robert jennifer michael linda william elizabeth david '
+               'barbara richard susan joseph jessica thomas sarah charles karen').split()
+LAST_NAMES = ('smith johnson williams brown jones garcia miller davis rodriguez martinez '
+              'hernandez lopez gonzalez wilson anderson thomas taylor moore jackson martin').split()
+DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'example.org')
+
+# A common first name, a name plus a partial surname, a common email domain, an
+# almost unique email prefix, and a miss
+QUERIES = ['john', 'john smi', 'gmail', 'mary.jones12', 'nobody']
+
+
+def fill_donors(app, count, random_seed=0):
+    """Insert count donors named from FIRST_NAMES/LAST_NAMES with unique emails."""
+    rng = random.Random(random_seed)
+    with app.app_context():
+        connection = db.session.connection()
+        for start in range(0, count, 100000):
+            rows = []
+            for i in range(start, min(count, start + 100000)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                rows.append((f'{first}.{last}{i}@{rng.choice(DOMAINS)}', f'{first.title()} {last.title()}'))
+            connection.exec_driver_sql('INSERT INTO donor (donor_email, donor_name) VALUES (?, ?)', rows)
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'search.sqlite3')
+        fill_donors(app, args.donors)
+        client = app.test_client()
+        for q in QUERIES:
+            def search():
+                response = client.get('/api/donor/search', query_string={'q': q})
+                assert response.status_code == 200, response.get_json()
+
+            def scan():
+                with app.app_context():
+                    pattern = f'%{q}%'
+                    Donor.query.filter(Donor.donor_name.like(pattern) | Donor.donor_email.like(pattern))\
+                        .limit(20).all()
+                    db.session.rollback()
+
+            results[q] = {'fts': time_calls(search, args.repeat),
+                          'like_scan': time_calls(scan, max(1, args.repeat // 10))}
+
+    print(f"{'query':14} {'fts p50':>10} {'fts p99':>10} {'LIKE p50':>10}")
+    for q, result in results.items():
+        print(f"{q:14} {result['fts']['p50_ms']:8.2f}ms {result['fts']['p99_ms']:8.2f}ms "
+              f"{result['like_scan']['p50_ms']:8.2f}ms")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
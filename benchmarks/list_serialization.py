@@ -0,0 +1,87 @@
+"""Compare list serialization through ORM objects with the tuple projection path.
+
+Fills a scratch database with donors and encodes the whole table as a JSON array
+three ways: Model.query.all() + serialize() + json dumps (the previous list endpoint
+path), Projection.encode over column tuples, and Projection.stream as used by
+``GET /api/donor?all=true``. Reports rows per second and peak traced memory of each.
+
+    python benchmarks/list_serialization.py --donors 200000
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app, seed  # noqa: E402
+from donman.controller.donor import DONOR_FIELDS  # noqa: E402
+from donman.model import db, Donor  # noqa: E402
+
+
+def orm_serialize(app):
+    return len(app.json.dumps([donor.serialize() for donor in Donor.query.order_by(Donor.donor_id).all()]))
+
+
+def projection_encode(app):
+    return len(DONOR_FIELDS.encode(DONOR_FIELDS.select(Donor.query).all()))
+
+
+def projection_stream(app):
+    # Chunks are consumed as a response would send them, never joined
+    return sum(len(chunk) for chunk in DONOR_FIELDS.stream(Donor.query))
+
+
+PATHS = {
+    'orm_serialize': orm_serialize,
+    'projection_encode': projection_encode,
+    'projection_stream': projection_stream,
+}
+
+
+def measure(app, fn, repeat):
+    """Return the best wall time over repeat runs, and the peak traced memory of one more."""
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        size = fn(app)
+        best = min(best, time.perf_counter() - start)
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn(app)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'lists.sqlite3')
+        seed(app, 0, donors=args.donors, distributions=0)
+        with app.app_context():
+            expected = json.loads(app.json.dumps([donor.serialize() for donor in Donor.query.order_by(Donor.donor_id)]))
+            assert json.loads(''.join(DONOR_FIELDS.stream(Donor.query))) == expected
+            for name, fn in PATHS.items():
+                seconds, peak, size = measure(app, fn, args.repeat)
+                results[name] = {'seconds': seconds, 'rows_per_second': args.donors / seconds,
+                                 'peak_bytes': peak, 'body_bytes': size}
+
+    for name, result in results.items():
+        print(f"{name:18} {result['rows_per_second']:10.0f} rows/s  peak {result['peak_bytes'] / 1e6:8.1f} MB")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure login throughput and the latency of other endpoints during a login storm.
+
+For each hashing mode (inline on the request thread, and the process pool) the
+report/list latency is measured on an idle server, then again while login threads
+hammer POST /api/staff/login.
+
+    python benchmarks/login_storm.py --login-threads 16 --seconds 10
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import ADMIN_EMAIL, ADMIN_PASSWORD, login, make_app, percentile, seed  # noqa: E402
+
+MODES = {
+    'inline': {'PASSWORD_HASH_WORKERS': 0},
+    'pool': {'PASSWORD_HASH_WORKERS': 2},
+}
+
+PROBE_URLS = ['/api/report/subtype/1', '/api/report/type/1', '/api/type']
+
+
+def probe(client, seconds):
+    """Fetch the probe URLs in a loop for the given time and return their latencies in ms."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for url in PROBE_URLS:
+            start = time.perf_counter()
+            client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def storm(app, deadline, counts, lock):
+    """Log in repeatedly until the deadline, counting successful logins."""
+    client = app.test_client()
+    done = 0
+    while time.perf_counter() < deadline:
+        response = client.post('/api/staff/login', json={
+            'staff_email': ADMIN_EMAIL, 'staff_password': ADMIN_PASSWORD})
+        if response.status_code == 200:
+            done += 1
+    with lock:
+        counts.append(done)
+
+
+def run(name, overrides, args, tmp):
+    app = make_app(pathlib.Path(tmp) / f'{name}.sqlite3', **overrides)
+    seed(app, donations=args.donations)
+    client = login(app)  # also starts the hashing pool
+
+    idle = probe(client, args.seconds / 2)
+
+    counts = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [threading.Thread(target=storm, args=(app, deadline, counts, lock))
+               for _ in range(args.login_threads)]
+    for thread in threads:
+        thread.start()
+    busy = probe(client, args.seconds)
+    for thread in threads:
+        thread.join()
+
+    return {
+        'logins_per_second': sum(counts) / args.seconds,
+        'idle_p50_ms': percentile(idle, 50),
+        'idle_p99_ms': percentile(idle, 99),
+        'storm_p50_ms': percentile(busy, 50),
+        'storm_p99_ms': percentile(busy, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=10000)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, overrides in MODES.items():
+            print(f'Running {name} hashing...', file=sys.stderr)
+            results[name] = run(name, overrides, args, tmp)
+
+    print(f"{'mode':8} {'logins/s':>10} {'idle p50':>10} {'idle p99':>10} {'storm p50':>10} {'storm p99':>10}")
+    for name, result in results.items():
+        print(f"{name:8} {result['logins_per_second']:10.1f} {result['idle_p50_ms']:8.2f}ms "
+              f"{result['idle_p99_ms']:8.2f}ms {result['storm_p50_ms']:8.2f}ms {result['storm_p99_ms']:8.2f}ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
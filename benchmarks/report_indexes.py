@@ -0,0 +1,113 @@
+"""Measure the report queries with and without the secondary indexes.
+
+Seeds a scratch database, drops the indexes declared on Donation and Distribution,
+then for every report-style endpoint records the EXPLAIN QUERY PLAN of each
+statement it runs and its latency. The indexes are then created again and the
+same measurements repeated. The report cache is disabled (REPORT_CACHE_SIZE = 0),
+so every call runs the report queries instead of a generation lookup.
+
+    python benchmarks/report_indexes.py --donations 1000000 --output indexes.json
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import capture_statements, explain, login, make_app, seed, time_calls  # noqa: E402
+from donman.ledger import find_drift  # noqa: E402
+from donman.model import db, Donation, Distribution  # noqa: E402
+
+INDEXED_TABLES = (Donation.__table__, Distribution.__table__)
+
+# Cache bookkeeping run by every report call; left out of the plans
+GENERATION_TABLE = 'write_generation'
+
+
+def endpoints(donors):
+    """Return (name, method, url, json) of the calls to measure."""
+    recent = (date.today() - timedelta(days=30)).isoformat()
+    return [
+        ('report_by_type', 'GET', '/api/report/type/1', None),
+        ('report_by_subtype', 'GET', '/api/report/subtype/1', None),
+        ('report_by_donor', 'GET', '/api/report/donor/1', None),
+        ('report_by_donor_batch', 'POST', '/api/report/donor/batch',
+         {'donor_ids': list(range(1, min(donors, 100) + 1))}),
+        ('export_donations_last_30_days', 'GET', f'/api/export/donations?start={recent}', None),
+        ('export_distributions_subtype', 'GET', '/api/export/distributions?subtype_id=1', None),
+    ]
+
+
+def set_indexes(app, present):
+    """Create or drop the secondary indexes, then refresh the planner statistics."""
+    with app.app_context():
+        for table in INDEXED_TABLES:
+            for index in table.indexes:
+                if present:
+                    index.create(db.engine, checkfirst=True)
+                else:
+                    index.drop(db.engine, checkfirst=True)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+
+
+def measure(app, client, calls, repeat):
+    """Return plans and latency for every call."""
+    results = {}
+    for name, method, url, payload in calls:
+        def call():
+            response = client.open(url, method=method, json=payload)
+            assert response.status_code == 200, (url, response.status_code)
+            return response.get_data()
+
+        with capture_statements(app) as statements:
+            call()
+        plans = [{'sql': statement, 'plan': explain(app, statement, parameters)}
+                 for statement, parameters in statements if GENERATION_TABLE not in statement]
+        results[name] = {'plans': plans, **time_calls(call, repeat)}
+    # Checking the ledger (flask rebuild-ledger --check-only) scans the raw rows
+    with app.app_context():
+        results['ledger_check'] = time_calls(find_drift, max(1, repeat // 5))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=200000)
+    parser.add_argument('--donors', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'bench.sqlite3', REPORT_CACHE_SIZE=0)
+        print(f'Seeding {args.donations} donations...', file=sys.stderr)
+        seed(app, donations=args.donations, donors=args.donors)
+        client = login(app)
+        calls = endpoints(args.donors)
+
+        results = {}
+        for phase, present in (('before', False), ('after', True)):
+            set_indexes(app, present)
+            results[phase] = measure(app, client, calls, args.repeat)
+
+    print(f"{'endpoint':32} {'before p50':>12} {'after p50':>12}")
+    for name in results['before']:
+        before = results['before'][name]['p50_ms']
+        after = results['after'][name]['p50_ms']
+        print(f'{name:32} {before:10.2f}ms {after:10.2f}ms')
+    for name, result in results['after'].items():
+        for plan in result.get('plans', []):
+            print(f'\n[{name}] {plan["sql"]}')
+            for line in plan['plan']:
+                print(f'    {line}')
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
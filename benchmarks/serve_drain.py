@@ -0,0 +1,99 @@
+"""Check that `flask serve` workers drain in-flight requests on SIGTERM.
+
+Runs the pre-forking Supervisor on a scratch app with an extra route that sleeps,
+sends SIGTERM to the supervisor while such a request is in progress, and checks
+that the request still completes with 200. A second run with a graceful timeout
+shorter than the request checks that shutdown is bounded: the request is cut off
+and the server exits soon after the timeout. Exits with status 1 on failure.
+
+    python benchmarks/serve_drain.py --request-seconds 2
+"""
+import argparse
+import multiprocessing
+import os
+import pathlib
+import signal
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app  # noqa: E402
+from benchmarks.serve_throughput import wait_for_port  # noqa: E402
+from donman.serve import Supervisor  # noqa: E402
+
+
+def serve(db_path, port, request_seconds, graceful_timeout):
+    """Run the supervisor with one worker; runs in a child process."""
+    app = make_app(db_path)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(request_seconds)
+        return 'done'
+
+    Supervisor(app, '127.0.0.1', port, 1, graceful_timeout=graceful_timeout, log=lambda message: None).run()
+
+
+def request(url, result):
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            result['status'] = response.status
+            result['body'] = response.read().decode()
+    except Exception as e:
+        result['error'] = repr(e)
+
+
+def run(db_path, port, request_seconds, graceful_timeout):
+    """SIGTERM the server during a slow request; return (request result, seconds to exit after SIGTERM)."""
+    server = multiprocessing.get_context('fork').Process(
+        target=serve, args=(db_path, port, request_seconds, graceful_timeout))
+    server.start()
+    try:
+        wait_for_port(port)
+        result = {}
+        client = threading.Thread(target=request, args=(f'http://127.0.0.1:{port}/slow', result))
+        client.start()
+        time.sleep(min(0.5, request_seconds / 4))
+        stopped = time.monotonic()
+        os.kill(server.pid, signal.SIGTERM)
+        server.join(timeout=request_seconds + graceful_timeout + 30)
+        exited = time.monotonic() - stopped
+        client.join()
+    finally:
+        if server.is_alive():
+            server.kill()
+            server.join()
+    return result, exited
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--request-seconds', type=float, default=2)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = pathlib.Path(tmp) / 'drain.sqlite3'
+
+        result, exited = run(db_path, args.port, args.request_seconds, graceful_timeout=30)
+        print(f"drain:   {result}, server exited {exited:.1f}s after SIGTERM")
+        if result.get('status') != 200 or result.get('body') != 'done':
+            failures.append(f'request in flight at SIGTERM did not complete: {result}')
+
+        timeout = args.request_seconds / 4
+        result, exited = run(db_path, args.port, args.request_seconds, graceful_timeout=timeout)
+        print(f"timeout: {result}, server exited {exited:.1f}s after SIGTERM (graceful timeout {timeout:.1f}s)")
+        if exited >= args.request_seconds:
+            failures.append(f'shutdown waited {exited:.1f}s, beyond the {timeout:.1f}s graceful timeout')
+
+    if failures:
+        sys.exit('FAILED: ' + '; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
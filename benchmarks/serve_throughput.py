@@ -0,0 +1,122 @@
+"""Compare throughput of `flask run` with `flask serve --workers N`.
+
+Seeds a scratch database, starts each server as a subprocess on it, and drives the
+read-only benchmark endpoints from several client processes for a fixed time.
+
+    python benchmarks/serve_throughput.py --workers 4 --clients 8 --seconds 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app, seed  # noqa: E402
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+PATHS = [
+    '/api/report/type/1',
+    '/api/report/subtype/1',
+    '/api/report/donor/1',
+    '/api/report/timeseries?bucket=month',
+    '/api/type',
+    '/api/donor',
+]
+
+
+def client(base_url, seconds, queue):
+    """Request PATHS round-robin until the time is up; report (ok, failed) on queue."""
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + PATHS[i % len(PATHS)], timeout=10) as response:
+                response.read()
+            ok += 1
+        except OSError:
+            failed += 1
+        i += 1
+    queue.put((ok, failed))
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def measure(command, env, port, args):
+    server = subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        queue = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(f'http://127.0.0.1:{port}', args.seconds, queue))
+                   for _ in range(args.clients)]
+        for process in clients:
+            process.start()
+        results = [queue.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    return {
+        'requests_per_second': sum(ok for ok, _ in results) / args.seconds,
+        'failed': sum(failed for _, failed in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = pathlib.Path(tmp) / 'serve.sqlite3'
+        seed(make_app(db_path), donations=args.donations)
+        settings = pathlib.Path(tmp) / 'settings.py'
+        settings.write_text(
+            f"SQLALCHEMY_DATABASE_URI = {'sqlite:///' + str(db_path)!r}\n"
+            f"METRICS_DIR = {str(pathlib.Path(tmp) / 'metrics')!r}\n")
+        env = {**os.environ, 'FLASK_APP': 'donman', 'DONMAN_SETTINGS': str(settings),
+               'PYTHONPATH': str(ROOT)}
+
+        servers = {
+            'flask run': ['flask', 'run', '--port', str(args.port), '--no-reload', '--no-debugger'],
+            f'flask serve --workers {args.workers}': ['flask', 'serve', '--port', str(args.port),
+                                                      '--workers', str(args.workers)],
+        }
+        results = {}
+        for name, command in servers.items():
+            print(f'Measuring {name}...', file=sys.stderr)
+            results[name] = measure(command, env, args.port, args)
+
+    for name, result in results.items():
+        print(f"{name:32} {result['requests_per_second']:10.1f} req/s  {result['failed']} failed")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare group-by/sum over a columnar snapshot with the same aggregate in SQL.
+
+Seeds a scratch database, writes a snapshot with donman.snapshot and times
+donman.analytics group_sum for a few groupings against the equivalent GROUP BY
+query, checking that both give the same totals. Also reports the snapshot write time
+and size. numpy is used when it is installed.
+
+    python benchmarks/snapshot_analytics.py --donations 1000000
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import make_app, seed, time_calls  # noqa: E402
+from donman import analytics  # noqa: E402
+from donman.model import db  # noqa: E402
+from donman.snapshot import write_snapshot  # noqa: E402
+
+# name: (snapshot table, group_sum key, equivalent SQL)
+QUERIES = {
+    'donations_per_subtype': (
+        'donations', 'subtype_id',
+        "SELECT subtype_id, SUM(donation_quantity) FROM donation GROUP BY 1"),
+    'donations_per_donor': (
+        'donations', 'donor_id',
+        "SELECT donor_id, SUM(donation_quantity) FROM donation GROUP BY 1"),
+    'donations_per_month': (
+        'donations', 'month',
+        "SELECT strftime('%Y-%m', donation_date), SUM(donation_quantity) FROM donation GROUP BY 1"),
+    'distributions_per_type': (
+        'distributions', 'type_id',
+        "SELECT subtype.type_id, SUM(distribution_amount) FROM distribution "
+        "JOIN subtype ON subtype.subtype_id = distribution.subtype_id GROUP BY 1"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=1000000)
+    parser.add_argument('--donors', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {'numpy': analytics.numpy is not None, 'queries': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'snapshot.sqlite3')
+        seed(app, args.donations, donors=args.donors)
+        directory = pathlib.Path(tmp) / 'snapshot'
+        with app.app_context():
+            start = time.perf_counter()
+            write_snapshot(directory)
+            results['write_seconds'] = time.perf_counter() - start
+        results['bytes'] = sum(path.stat().st_size for path in directory.rglob('*') if path.is_file())
+
+        with app.app_context(), analytics.Snapshot(directory) as snapshot:
+            for name, (table, by, sql) in QUERIES.items():
+                expected = dict(db.session.execute(db.text(sql)).all())
+                assert snapshot.group_sum(table, by) == expected, name
+                results['queries'][name] = {
+                    'snapshot': time_calls(lambda: snapshot.group_sum(table, by), args.repeat),
+                    'sql': time_calls(lambda: db.session.execute(db.text(sql)).all(), args.repeat),
+                }
+
+    print(f"snapshot written in {results['write_seconds']:.2f}s, {results['bytes'] / 1e6:.1f} MB, "
+          f"numpy {'on' if results['numpy'] else 'off'}")
+    for name, result in results['queries'].items():
+        print(f"{name:24} snapshot p50 {result['snapshot']['p50_ms']:9.1f} ms   sql p50 {result['sql']['p50_ms']:9.1f} ms")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
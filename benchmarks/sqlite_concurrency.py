@@ -0,0 +1,120 @@
+"""Compare writer/reader throughput with SQLite defaults and the tuned pragmas.
+
+For each configuration a fresh scratch database is seeded, then writer threads post
+donations while reader threads fetch reports for a fixed duration. Throughput and
+failed requests (e.g. "database is locked") are reported per role.
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --seconds 10
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import login, make_app, percentile, seed  # noqa: E402
+from donman.config import Config  # noqa: E402
+
+CONFIGURATIONS = {
+    # SQLite's own defaults: rollback journal, FULL sync, pool defaults
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLALCHEMY_POOL_OPTIONS': {}},
+    'tuned': {
+        'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS,
+        'SQLALCHEMY_POOL_OPTIONS': Config.SQLALCHEMY_POOL_OPTIONS,
+    },
+}
+
+
+def worker(app, role, deadline, donors, subtypes, stats, lock):
+    """Issue requests of one role until the deadline and add the outcome to stats."""
+    client = login(app)
+    rng = random.Random()
+    latencies = []
+    ok = failed = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if role == 'writer':
+            response = client.post('/api/donation', json={
+                'donor_id': rng.randint(1, donors),
+                'subtype_id': rng.randint(1, subtypes),
+                'donation_quantity': rng.randint(1, 100)})
+        else:
+            response = client.get(rng.choice([
+                f'/api/report/donor/{rng.randint(1, donors)}',
+                f'/api/report/subtype/{rng.randint(1, subtypes)}',
+                '/api/report/type/1',
+                '/api/report/timeseries?bucket=month']))
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+    with lock:
+        entry = stats[role]
+        entry['ok'] += ok
+        entry['failed'] += failed
+        entry['latencies'].extend(latencies)
+
+
+def run(name, overrides, args, tmp):
+    app = make_app(pathlib.Path(tmp) / f'{name}.sqlite3', **overrides)
+    seed(app, donations=args.donations, donors=args.donors)
+    subtypes = 50
+    stats = {role: {'ok': 0, 'failed': 0, 'latencies': []} for role in ('writer', 'reader')}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(app, role, deadline, args.donors, subtypes, stats, lock))
+        for role, count in (('writer', args.writers), ('reader', args.readers))
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result = {}
+    for role, entry in stats.items():
+        latencies = entry['latencies'] or [0.0]
+        result[role] = {
+            'requests_per_second': entry['ok'] / args.seconds,
+            'failed': entry['failed'],
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=100000)
+    parser.add_argument('--donors', type=int, default=5000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, overrides in CONFIGURATIONS.items():
+            print(f'Running {name} configuration...', file=sys.stderr)
+            results[name] = run(name, overrides, args, tmp)
+
+    print(f"{'config':10} {'role':8} {'req/s':>10} {'failed':>8} {'p50':>10} {'p99':>10}")
+    for name, result in results.items():
+        for role, entry in result.items():
+            print(f"{name:10} {role:8} {entry['requests_per_second']:10.1f} {entry['failed']:8d} "
+                  f"{entry['p50_ms']:8.2f}ms {entry['p99_ms']:8.2f}ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
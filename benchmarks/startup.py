@@ -0,0 +1,123 @@
+"""Measure cold-start cost and fail when it exceeds a budget.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``: the full
+API, a report-only process (BLUEPRINTS = ['report', 'metrics']) and a ``flask`` CLI
+command. Reports the median over --repeat runs of the total import time, and of the
+time from the first line of the process to the first request answered (wall time of
+the whole command for the CLI). Exits with status 1 when a median exceeds its budget.
+The report-only process is not expected to start faster: Flask and SQLAlchemy make
+up most of the import time of both, and the difference stays within run-to-run noise.
+
+    python benchmarks/startup.py --import-budget-ms 1000 --first-request-budget-ms 1500
+"""
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import make_app, seed  # noqa: E402
+
+# Child process: build the app and answer one request, timing from its first line
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import donman
+app = donman.create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[2])
+done = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'create_app_ms': (created - start) * 1000, 'first_request_ms': (done - start) * 1000}))
+"""
+
+# name: (create_app config, first request path)
+APP_SCENARIOS = {
+    'full_api': ({}, '/api/type'),
+    'report_only': ({'BLUEPRINTS': ['report', 'metrics']}, '/api/report/inventory'),
+}
+
+CLI_COMMAND = ['-m', 'flask', '--app', 'donman', 'rebuild-ledger', '--check-only']
+
+
+def import_ms(stderr):
+    """Sum the cumulative time of the top-level imports in -X importtime output."""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total / 1000
+
+
+def run(args, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], env=env, cwd=ROOT,
+                            capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'{args} failed:\n{result.stderr[-2000:]}')
+    return result, wall_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=1000,
+                        help='Budget for the median total import time of every scenario.')
+    parser.add_argument('--first-request-budget-ms', type=float, default=1500,
+                        help='Budget for the median time to first request (CLI: whole command).')
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = pathlib.Path(tmp) / 'startup.sqlite3'
+        app = make_app(db_path)
+        seed(app, 1000, donors=100)
+        settings = pathlib.Path(tmp) / 'settings.py'
+        settings.write_text(f"SQLALCHEMY_DATABASE_URI = {'sqlite:///' + str(db_path)!r}\n"
+                            f"METRICS_DIR = {str(db_path.with_suffix('.metrics'))!r}\n"
+                            "PASSWORD_HASH_WORKERS = 0\n")
+        env = {**os.environ, 'DONMAN_SETTINGS': str(settings),
+               'PYTHONPATH': os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')]))}
+
+        for name, (config, path) in APP_SCENARIOS.items():
+            samples = []
+            for _ in range(args.repeat):
+                result, _ = run(['-c', CHILD, json.dumps(config), path], env)
+                samples.append({**json.loads(result.stdout.splitlines()[-1]), 'import_ms': import_ms(result.stderr)})
+            results[name] = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+        samples = []
+        for _ in range(args.repeat):
+            result, wall_ms = run(CLI_COMMAND, env)
+            samples.append({'import_ms': import_ms(result.stderr), 'first_request_ms': wall_ms})
+        results['cli'] = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+    over_budget = []
+    for name, result in results.items():
+        print(f"{name:12} imports {result['import_ms']:7.1f} ms   first request {result['first_request_ms']:7.1f} ms")
+        if result['import_ms'] > args.import_budget_ms:
+            over_budget.append(f"{name}: imports {result['import_ms']:.0f} ms > {args.import_budget_ms:.0f} ms")
+        if result['first_request_ms'] > args.first_request_budget_ms:
+            over_budget.append(f"{name}: first request {result['first_request_ms']:.0f} ms "
+                               f"> {args.first_request_budget_ms:.0f} ms")
+    if args.output:
+        args.output.write_text(json.dumps({'results': results, 'over_budget': over_budget}, indent=2))
+    if over_budget:
+        sys.exit('Over budget:\n  ' + '\n  '.join(over_budget))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Stress enforced stock with concurrent distributions against a few subtypes.
+
+Registers a handful of fresh subtypes (no seeded donations) in a scratch database
+with ENFORCE_STOCK on, donates --stock units to each, then lets many threads post
+distributions against them until all of that stock is gone or the time is up.
+Afterwards it checks that requests were refused for insufficient stock, that the
+accepted amounts add up to exactly the stock of each subtype with no balance below
+zero, and that the ledger still matches the raw rows. Reports accepted
+distributions per second under contention.
+
+    python benchmarks/stock_contention.py --threads 16 --subtypes 2 --stock 500 --seconds 30
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import login, make_app, percentile, seed  # noqa: E402
+from donman.ledger import find_drift  # noqa: E402
+from donman.model import db, SubtypeLedger  # noqa: E402
+
+
+def worker(app, deadline, done, subtype_ids, max_amount, stats, lock):
+    """Post distributions until the deadline or done is set and add the outcome to stats."""
+    client = login(app)
+    rng = random.Random()
+    counts = {200: 0, 409: 0, 'failed': 0}
+    accepted = dict.fromkeys(subtype_ids, 0)
+    latencies = []
+    while time.perf_counter() < deadline and not done.is_set():
+        subtype_id = rng.choice(subtype_ids)
+        amount = rng.randint(1, max_amount)
+        start = time.perf_counter()
+        response = client.post('/api/distribution', json={
+            'subtype_id': subtype_id, 'distribution_amount': amount})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code == 200:
+            accepted[subtype_id] += amount
+        if response.status_code in counts:
+            counts[response.status_code] += 1
+        else:
+            counts['failed'] += 1
+    with lock:
+        for key, value in counts.items():
+            stats[key] += value
+        for subtype_id, amount in accepted.items():
+            stats['accepted_amount'][subtype_id] += amount
+        stats['latencies'].extend(latencies)
+
+
+def remaining(app, subtype_ids):
+    with app.app_context():
+        return dict(db.session.query(SubtypeLedger.subtype_id, SubtypeLedger.remaining_amount)
+                    .filter(SubtypeLedger.subtype_id.in_(subtype_ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--subtypes', type=int, default=2, help='Number of contended subtypes.')
+    parser.add_argument('--stock', type=int, default=500, help='Stock donated to each contended subtype.')
+    parser.add_argument('--max-amount', type=int, default=5)
+    parser.add_argument('--seconds', type=float, default=30, help='Upper bound on the run time.')
+    parser.add_argument('--output', type=pathlib.Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(pathlib.Path(tmp) / 'stock.sqlite3', ENFORCE_STOCK=True)
+        seed(app, donations=1000, donors=100, distributions=0)
+        client = login(app)
+        # Fresh subtypes, so their only stock is the donation below
+        response = client.post('/api/type', json={'type_name': 'contended'})
+        assert response.status_code == 201, response.get_json()
+        type_id = response.get_json()['type_id']
+        subtype_ids = []
+        for i in range(args.subtypes):
+            response = client.post('/api/type/sub', json={'type_id': type_id, 'subtype_name': f'contended {i}'})
+            assert response.status_code == 200, response.get_json()
+            subtype_ids.append(response.get_json()['subtype_id'])
+        for subtype_id in subtype_ids:
+            response = client.post('/api/donation', json={
+                'donor_id': 1, 'subtype_id': subtype_id, 'donation_quantity': args.stock})
+            assert response.status_code == 200, response.get_json()
+        assert remaining(app, subtype_ids) == dict.fromkeys(subtype_ids, args.stock)
+
+        stats = {200: 0, 409: 0, 'failed': 0, 'latencies': [],
+                 'accepted_amount': dict.fromkeys(subtype_ids, 0)}
+        lock = threading.Lock()
+        done = threading.Event()
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        threads = [threading.Thread(target=worker,
+                                    args=(app, deadline, done, subtype_ids, args.max_amount, stats, lock))
+                   for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        # Stop the workers once every contended subtype is out of stock
+        while time.perf_counter() < deadline and any(remaining(app, subtype_ids).values()):
+            time.sleep(0.1)
+        done.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        balances = remaining(app, subtype_ids)
+        with app.app_context():
+            drift = find_drift()
+
+    latencies = stats['latencies'] or [0.0]
+    result = {
+        'seconds': elapsed,
+        'distributions_per_second': stats[200] / elapsed,
+        'accepted': stats[200],
+        'rejected_insufficient_stock': stats[409],
+        'failed': stats['failed'],
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'accepted_amount': {str(subtype_id): amount for subtype_id, amount in stats['accepted_amount'].items()},
+        'remaining': {str(subtype_id): amount for subtype_id, amount in balances.items()},
+        'ledger_drift': len(drift),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2))
+
+    failures = []
+    if any(amount < 0 for amount in balances.values()):
+        failures.append('a balance went negative')
+    if drift:
+        failures.append('the ledger drifted from the raw rows')
+    if stats['failed']:
+        failures.append(f"{stats['failed']} request(s) failed")
+    if not stats[409]:
+        failures.append('no distribution was refused for insufficient stock')
+    if any(amount != args.stock for amount in stats['accepted_amount'].values()):
+        failures.append('accepted amounts do not add up to the stock of each subtype '
+                        '(not drained in time? raise --seconds)')
+    if failures:
+        sys.exit('FAILED: ' + '; '.join(failures))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""In-process benchmark suite covering every blueprint.
+
+For each data size a scratch database is seeded, then every case is run through the
+Flask test client against create_app(). Latency percentiles and the number of SQL
+statements per request are written to a JSON results file so runs can be compared.
+
+    python benchmarks/suite.py --sizes 10000,1000000 --output results.json
+"""
+import argparse
+import itertools
+import json
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import ADMIN_EMAIL, ADMIN_PASSWORD, login, make_app, percentile, seed  # noqa: E402
+from donman.model import db  # noqa: E402
+
+
+def cases(donors):
+    """
+    Return the benchmark cases as (blueprint, name, method, url, payload).
+
+    payload is either None, a JSON value, or a callable taking the iteration number,
+    for requests that must not repeat (e.g. unique donor emails).
+    """
+    recent = (date.today() - timedelta(days=7)).isoformat()
+    unique = itertools.count()
+    return [
+        ('donation', 'register_donation', 'POST', '/api/donation',
+         {'donor_id': 1, 'donation_quantity': 5, 'subtype_id': 1}),
+        ('donation', 'register_donation_batch_100', 'POST', '/api/donation/batch',
+         [{'donor_id': d % donors + 1, 'donation_quantity': 5, 'subtype_id': 1} for d in range(100)]),
+        ('distribution', 'register_distribution', 'POST', '/api/distribution',
+         {'subtype_id': 1, 'distribution_amount': 1}),
+        ('distribution', 'register_distribution_batch_100', 'POST', '/api/distribution/batch',
+         [{'subtype_id': 1, 'distribution_amount': 1}] * 100),
+        ('donor', 'get_donors_page', 'GET', '/api/donor', None),
+        ('donor', 'get_donors_name_prefix', 'GET', '/api/donor?name=donor%201', None),
+        ('donor', 'register_donor', 'POST', '/api/donor',
+         lambda i: {'donor_name': 'bench donor', 'donor_email': f'bench{next(unique)}@example.com'}),
+        ('type', 'get_types', 'GET', '/api/type', None),
+        ('type', 'get_subtypes', 'GET', '/api/type/sub?type_id=1', None),
+        ('report', 'report_by_type', 'GET', '/api/report/type/1', None),
+        ('report', 'report_by_subtype', 'GET', '/api/report/subtype/1', None),
+        ('report', 'report_by_donor', 'GET', '/api/report/donor/1', None),
+        ('report', 'report_by_donor_batch_100', 'POST', '/api/report/donor/batch',
+         {'donor_ids': list(range(1, min(donors, 100) + 1))}),
+        ('report', 'report_top_donors_month', 'GET', '/api/report/donors/top?period=month', None),
+        ('report', 'report_top_donors_all_by_type', 'GET', '/api/report/donors/top?period=all&type_id=1', None),
+        ('report', 'report_inventory', 'GET', '/api/report/inventory', None),
+        ('report', 'report_timeseries_month', 'GET', '/api/report/timeseries?bucket=month', None),
+        ('staff', 'get_all_staff', 'GET', '/api/staff', None),
+        ('staff', 'login_staff', 'POST', '/api/staff/login',
+         {'staff_email': ADMIN_EMAIL, 'staff_password': ADMIN_PASSWORD}),
+        ('export', 'export_donations_last_week', 'GET', f'/api/export/donations?start={recent}', None),
+    ]
+
+
+def run_size(size, args, tmp):
+    """Seed a database of the given size and run every case against it."""
+    donors = max(1000, size // 100)
+    app = make_app(pathlib.Path(tmp) / f'{size}.sqlite3')
+    started = time.perf_counter()
+    seed(app, donations=size, donors=donors)
+    seed_seconds = time.perf_counter() - started
+    client = login(app)
+
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+
+    results = {}
+    try:
+        for blueprint, name, method, url, payload in cases(donors):
+            repeat = args.login_repeat if name == 'login_staff' else args.repeat
+            latencies = []
+            statements[0] = 0
+            for i in range(repeat):
+                body = payload(i) if callable(payload) else payload
+                start = time.perf_counter()
+                response = client.open(url, method=method, json=body)
+                response.get_data()
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code not in (200, 201):
+                    raise RuntimeError(f'{name}: {url} returned {response.status_code}')
+            results[name] = {
+                'blueprint': blueprint,
+                'requests': repeat,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'queries_per_request': statements[0] / repeat,
+            }
+            print(f"{size:>10} {name:34} p50 {results[name]['p50_ms']:8.2f}ms  "
+                  f"p99 {results[name]['p99_ms']:8.2f}ms  queries {results[name]['queries_per_request']:6.1f}",
+                  file=sys.stderr)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    return {'donations': size, 'donors': donors, 'seed_seconds': seed_seconds, 'cases': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000',
+                        help='Comma-separated donation counts, e.g. 10000,1000000,10000000.')
+    parser.add_argument('--repeat', type=int, default=100, help='Requests per case.')
+    parser.add_argument('--login-repeat', type=int, default=10, help='Requests for the (slow) login case.')
+    parser.add_argument('--output', type=pathlib.Path, default=pathlib.Path('bench_results.json'))
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            runs.append(run_size(size, args, tmp))
+
+    args.output.write_text(json.dumps({
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'runs': runs,
+    }, indent=2))
+    print(f'Wrote {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
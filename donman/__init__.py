@@ -1,11 +1,12 @@
-from donman.controller import create_app
-from flask_migrate import Migrate 
-from donman.model import db
-import sys; print(sys.executable)
+"""Donation management API.
 
-app = create_app()
-migrate = Migrate(app, db)
+``flask --app donman`` and WSGI servers (``donman:create_app()``) build the app with
+create_app. Importing the package itself does nothing else, so tools such as
+donman.analytics can be used without Flask.
+"""
 
-import donman.cli
-if __name__ == '__main__':
-    app.run()
\ No newline at end of file
+
+def create_app(config=None):
+    """Create the app; see donman.controller.create_app."""
+    from donman.controller import create_app
+    return create_app(config)
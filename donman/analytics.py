@@ -0,0 +1,246 @@
+"""Group-by/sum over a columnar snapshot written by ``flask snapshot`` (donman.snapshot).
+
+Columns are memory-mapped read-only and processed CHUNK_ROWS rows at a time, so a
+query touches only the columns it needs and its memory use does not depend on the
+snapshot size. Nothing here uses the app, the session or the ORM; a snapshot can
+be analysed on another machine with just this module.
+
+With numpy installed the chunks are numpy arrays and the grouping is vectorised
+(unique + bincount); without it the same queries run over plain memoryviews.
+
+    with Snapshot('var/snapshot') as snapshot:
+        per_month = snapshot.group_sum('donations', 'month', start=date(2024, 1, 1))
+        per_type = snapshot.group_sum('distributions', 'type_id')
+"""
+import heapq
+import json
+import mmap
+import sys
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    import numpy
+except ImportError:  # optional: the pure-Python path gives the same results
+    numpy = None
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'snapshot.json'
+
+# Rows per processed chunk
+CHUNK_ROWS = 1 << 20
+
+# Derived group-by keys, on top of the stored columns
+DERIVED_KEYS = ('type_id', 'day', 'month', 'year')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _seconds(value):
+    """Epoch seconds of a date/datetime bound, matching how snapshot dates are stored."""
+    if value is None or isinstance(value, int):
+        return value
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(seconds=1)
+
+
+def _label(key, value):
+    """Turn a derived date key (days/months/years since the epoch) into an ISO string."""
+    if key == 'day':
+        return (_EPOCH + timedelta(days=value)).date().isoformat()
+    if key == 'month':
+        return f'{1970 + value // 12:04d}-{value % 12 + 1:02d}'
+    if key == 'year':
+        return f'{1970 + value:04d}'
+    return value
+
+
+def _date_key(key, seconds):
+    day = seconds // 86400
+    if key == 'day':
+        return day
+    moment = date.fromordinal(719163 + day)  # 719163 == date(1970, 1, 1).toordinal()
+    return (moment.year - 1970) * 12 + moment.month - 1 if key == 'month' else moment.year - 1970
+
+
+class Snapshot:
+    """A read-only, memory-mapped snapshot directory."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        try:
+            self.manifest = json.loads((self.directory / MANIFEST).read_text())
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f'Not a snapshot directory: {self.directory} ({e})')
+        if self.manifest.get('format') != SNAPSHOT_FORMAT:
+            raise SnapshotError(f'Unsupported snapshot format {self.manifest.get("format")!r}')
+        if self.manifest['byteorder'] != sys.byteorder:
+            raise SnapshotError(f'Snapshot was written on a {self.manifest["byteorder"]}-endian machine')
+        self._maps = {}
+        self._subtypes = None
+
+    def close(self):
+        for mapped in self._maps.values():
+            try:
+                if mapped is not None:
+                    mapped.close()
+            except BufferError:
+                # A column returned by column() is still referenced; the map is
+                # released with it instead
+                pass
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def tables(self):
+        return list(self.manifest['tables'])
+
+    def rows(self, table):
+        return self._table(table)['rows']
+
+    def columns(self, table):
+        return list(self._table(table)['columns'])
+
+    def _table(self, table):
+        try:
+            return self.manifest['tables'][table]
+        except KeyError:
+            raise SnapshotError(f'Unknown table {table!r}; expected one of {self.tables}')
+
+    def column(self, table, name):
+        """Return a whole column as a memoryview (or numpy array) over the mapped file."""
+        spec = self._table(table)['columns'].get(name)
+        if spec is None:
+            raise SnapshotError(f'Unknown column {name!r} of {table}; expected one of {self.columns(table)}')
+        typecode = spec['typecode']
+        if array(typecode).itemsize != spec['itemsize']:
+            raise SnapshotError(f'Column {table}.{name} has {spec["itemsize"]}-byte items, '
+                                f'but typecode {typecode!r} is {array(typecode).itemsize} bytes here')
+        key = (table, name)
+        if key not in self._maps:
+            with open(self.directory / table / f'{name}.bin', 'rb') as file:
+                # mmap cannot map an empty file
+                self._maps[key] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.rows(table) else None
+        mapped = self._maps[key]
+        if numpy is not None:
+            return numpy.frombuffer(mapped, dtype=typecode) if mapped is not None else numpy.empty(0, typecode)
+        return memoryview(mapped).cast(typecode) if mapped is not None else memoryview(array(typecode))
+
+    def chunks(self, table, names, chunk_rows=CHUNK_ROWS):
+        """Yield tuples of column slices, chunk_rows rows at a time."""
+        columns = [self.column(table, name) for name in names]
+        for start in range(0, self.rows(table), chunk_rows):
+            yield tuple(column[start:start + chunk_rows] for column in columns)
+
+    def subtypes(self):
+        """Return {subtype_id: {"subtype_name", "type_id", "type_name"}} from the subtype dictionary."""
+        if self._subtypes is None:
+            path = self.directory / self.manifest['dictionaries']['subtypes']
+            self._subtypes = {entry.pop('subtype_id'): entry for entry in json.loads(path.read_text())}
+        return self._subtypes
+
+    def donor_names(self, donor_ids):
+        """Return {donor_id: donor_name} for the given IDs, scanning the donor dictionary once."""
+        wanted = set(donor_ids)
+        names = {}
+        with open(self.directory / self.manifest['dictionaries']['donors'], encoding='utf-8') as file:
+            for line in file:
+                donor_id, donor_name = json.loads(line)
+                if donor_id in wanted:
+                    names[donor_id] = donor_name
+                    if len(names) == len(wanted):
+                        break
+        return names
+
+    def group_sum(self, table, by, value='quantity', start=None, end=None):
+        """
+        Sum a column per distinct value of another, e.g. quantity per subtype_id.
+
+        by is a column of the table or a derived key: "type_id" (from subtype_id via
+        the subtype dictionary), or "day", "month" or "year" of the date column,
+        returned as ISO strings. start and end are optional date/datetime bounds on the
+        date column, start inclusive and end exclusive. Returns {key: total} in key order.
+        """
+        names = [value, 'subtype_id' if by == 'type_id' else 'date' if by in DERIVED_KEYS else by]
+        bounded = start is not None or end is not None
+        if bounded:
+            names.append('date')
+        start, end = _seconds(start), _seconds(end)
+
+        type_of = None
+        if by == 'type_id':
+            type_of = {subtype_id: entry['type_id'] for subtype_id, entry in self.subtypes().items()}
+            if numpy is not None:
+                # subtype_id -> type_id as an array indexed by subtype_id; unknown IDs map to 0
+                lookup = numpy.zeros(max(type_of, default=0) + 1, dtype=numpy.int64)
+                lookup[list(type_of)] = list(type_of.values())
+                type_of = lookup
+        totals = {}
+        for chunk in self.chunks(table, names):
+            values, keys = chunk[0], chunk[1]
+            dates = chunk[2] if bounded else None
+            if numpy is not None:
+                self._group_sum_numpy(totals, by, values, keys, dates, start, end, type_of)
+            else:
+                self._group_sum_python(totals, by, values, keys, dates, start, end, type_of)
+        return {_label(by, key): totals[key] for key in sorted(totals)}
+
+    @staticmethod
+    def _group_sum_numpy(totals, by, values, keys, dates, start, end, type_of):
+        if dates is not None:
+            mask = numpy.ones(len(dates), dtype=bool)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates < end
+            values, keys = values[mask], keys[mask]
+        if by == 'type_id':
+            keys = numpy.where(keys < len(type_of), type_of[numpy.clip(keys, 0, len(type_of) - 1)], 0)
+        elif by in ('day', 'month', 'year'):
+            keys = keys.astype('datetime64[s]').astype({'day': 'datetime64[D]', 'month': 'datetime64[M]',
+                                                        'year': 'datetime64[Y]'}[by]).astype(numpy.int64)
+        unique, inverse = numpy.unique(keys, return_inverse=True)
+        # bincount sums in float64, which is exact for per-chunk totals below 2**53
+        sums = numpy.rint(numpy.bincount(inverse, weights=values, minlength=len(unique))).astype(numpy.int64)
+        for key, total in zip(unique.tolist(), sums.tolist()):
+            totals[key] = totals.get(key, 0) + total
+
+    @staticmethod
+    def _group_sum_python(totals, by, values, keys, dates, start, end, type_of):
+        get = totals.get
+        if dates is None and by not in DERIVED_KEYS:
+            for key, amount in zip(keys, values):
+                totals[key] = get(key, 0) + amount
+            return
+        convert = {}
+        for index, (key, amount) in enumerate(zip(keys, values)):
+            if dates is not None:
+                moment = dates[index]
+                if (start is not None and moment < start) or (end is not None and moment >= end):
+                    continue
+            if by == 'type_id':
+                key = type_of.get(key, 0)
+            elif by in DERIVED_KEYS:
+                # Many rows share a day; convert each distinct timestamp day once
+                day = key // 86400
+                if day not in convert:
+                    convert[day] = _date_key(by, key)
+                key = convert[day]
+            totals[key] = get(key, 0) + amount
+
+    def top(self, table, by, n, value='quantity', start=None, end=None):
+        """Return the n (key, total) pairs with the largest totals, largest first."""
+        return heapq.nlargest(n, self.group_sum(table, by, value, start, end).items(), key=lambda item: item[1])
@@ -0,0 +1,336 @@
+"""Caches invalidated through write generations.
+
+A write generation is a counter row in the ``write_generation`` table that is bumped
+in the same transaction as the writes it covers. Cache entries are keyed by the
+generation they were computed under, so every worker process notices a write made
+by any other process on its next generation lookup (a primary-key read) and stops
+serving the stale entry.
+
+The caches live in process memory. Report results can instead be kept in an SQLite
+file shared by all workers on the host (REPORT_CACHE_PATH); as its keys embed the
+generations too, it never needs to be purged, only trimmed to its size.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+from sqlalchemy.dialects.sqlite import insert
+from donman.model import db, Type, Subtype, WriteGeneration
+
+# Generation covering the type and subtype tables
+CATALOG = 'catalog'
+
+# Generation bumped by bulk rewrites (seed, ledger rebuild) that invalidate every report
+REPORTS = 'reports'
+
+# Upper bound on generation names per statement, well below SQLite's bound-parameter limit
+GENERATION_CHUNK = 500
+
+# Prefix of the generations covering donations: one for all time, one per calendar
+# year ("donations:2024") and one per month ("donations:2024-05")
+DONATIONS = 'donations'
+
+
+class LRUCache:
+    """A thread-safe mapping that evicts the least recently used entry beyond maxsize."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    An LRUCache-like store of JSON values in an SQLite file, shared by the processes
+    of one host.
+
+    Each thread of each process opens its own connection. Recency is refreshed at most
+    every TOUCH_SECONDS per entry, so hits rarely write, and the table is trimmed to
+    maxsize entries every TRIM_EVERY puts. Errors of the store count as misses.
+    """
+    TOUCH_SECONDS = 60
+    TRIM_EVERY = 100
+
+    def __init__(self, path, maxsize):
+        self.path = str(path)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # A connection must not be used across fork, so it is tied to the process ID
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_used ON cache (used)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, default=None):
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT value, used FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and time.time() - row[1] > self.TOUCH_SECONDS:
+                connection.execute('UPDATE cache SET used = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.Error:
+            row = None
+        self._count(row is not None)
+        return default if row is None else json.loads(row[0])
+
+    def put(self, key, value):
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO cache (key, value, used) VALUES (?, ?, ?)',
+                               (key, json.dumps(value), time.time()))
+            with self._lock:
+                self._puts += 1
+                trim = self._puts % self.TRIM_EVERY == 0
+            if trim:
+                connection.execute('DELETE FROM cache WHERE key IN '
+                                   '(SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                                   (self.maxsize,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM cache')
+        except sqlite3.Error:
+            pass
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM cache').fetchone()[0]
+
+
+def bump_generation(*names):
+    """Stage an increment of one or more write generations; commit it with the covered writes."""
+    names = list(names)
+    for start in range(0, len(names), GENERATION_CHUNK):
+        stmt = insert(WriteGeneration).values([
+            {'name': name, 'generation': 1} for name in names[start:start + GENERATION_CHUNK]])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[WriteGeneration.name],
+            set_={'generation': WriteGeneration.generation + 1},
+        )
+        db.session.execute(stmt)
+
+
+def get_generation(name):
+    """Return the current value of a write generation (0 if it was never bumped)."""
+    return db.session.query(WriteGeneration.generation)\
+        .filter(WriteGeneration.name == name).scalar() or 0
+
+
+def get_generations(names):
+    """Return {name: generation} for the given names with one query per chunk of names."""
+    names = list(names)
+    generations = dict.fromkeys(names, 0)
+    for start in range(0, len(names), GENERATION_CHUNK):
+        generations.update(db.session.query(WriteGeneration.name, WriteGeneration.generation)
+                           .filter(WriteGeneration.name.in_(names[start:start + GENERATION_CHUNK])))
+    return generations
+
+
+def _app_cache(label, size_setting, factory=LRUCache):
+    name = f'donman_{label}_cache'
+    cache = current_app.extensions.get(name)
+    if cache is None:
+        cache = current_app.extensions.setdefault(name, factory(current_app.config[size_setting]))
+        # Let the metrics endpoint report the cache's hit and miss counters
+        metrics = current_app.extensions.get('donman_metrics')
+        if metrics is not None:
+            metrics.caches[label] = cache
+    return cache
+
+
+def catalog_cache():
+    """Return the catalogue cache of the current app."""
+    return _app_cache('catalog', 'CATALOG_CACHE_SIZE')
+
+
+def leaderboard_cache():
+    """Return the donor leaderboard cache of the current app."""
+    return _app_cache('leaderboard', 'LEADERBOARD_CACHE_SIZE')
+
+
+def report_cache():
+    """Return the report cache of the current app: shared if REPORT_CACHE_PATH is set."""
+    path = current_app.config['REPORT_CACHE_PATH']
+    if path:
+        return _app_cache('report', 'REPORT_CACHE_SIZE', factory=lambda maxsize: SQLiteCache(path, maxsize))
+    return _app_cache('report', 'REPORT_CACHE_SIZE')
+
+
+def subtype_generation(subtype_id):
+    return f'subtype:{subtype_id}'
+
+
+def type_generation(type_id):
+    return f'type:{type_id}'
+
+
+def donor_generation(donor_id):
+    return f'donor:{donor_id}'
+
+
+def invalidate_reports(subtype_ids=(), donor_ids=(), type_ids=()):
+    """
+    Stage generation bumps for the reports of the given subtypes, donors and types.
+
+    The type of each subtype is taken from the catalogue, so a write to a subtype also
+    invalidates its type's report. IDs may be given as numeric strings, as SQLite stores
+    them as integers either way.
+    """
+    subtype_ids = [int(subtype_id) for subtype_id in subtype_ids]
+    names = {subtype_generation(subtype_id) for subtype_id in subtype_ids}
+    if subtype_ids:
+        subtypes = get_catalog()['subtypes']
+        names.update(type_generation(subtypes[subtype_id][0]) for subtype_id in subtype_ids
+                     if subtype_id in subtypes)
+    names.update(type_generation(int(type_id)) for type_id in type_ids)
+    names.update(donor_generation(int(donor_id)) for donor_id in donor_ids)
+    if names:
+        bump_generation(*sorted(names))
+
+
+def cached_reports(kind, ids, generation_names, build):
+    """
+    Return {id: report} for ids, serving each from the report cache while it is exact.
+
+    generation_names(id) lists the generations the report of id depends on; the cache
+    key is stamped with their current values (and REPORTS), read in one go for all ids.
+    build(missing_ids) computes {id: report} for the ids that were not cached.
+    """
+    names = {id_: [REPORTS, *generation_names(id_)] for id_ in ids}
+    generations = get_generations({name for id_names in names.values() for name in id_names})
+    cache = report_cache()
+    reports = {}
+    keys = {}
+    for id_ in ids:
+        keys[id_] = f"{kind}:{id_}:" + ','.join(str(generations[name]) for name in names[id_])
+        report = cache.get(keys[id_])
+        if report is not None:
+            reports[id_] = report
+    missing = [id_ for id_ in ids if id_ not in reports]
+    if missing:
+        built = build(missing)
+        for id_ in missing:
+            reports[id_] = built[id_]
+            cache.put(keys[id_], built[id_])
+    return reports
+
+
+def donation_generation(day=None):
+    """
+    Return the name of the generation covering the donations of day's month, of
+    day's year if day is an int, or of all time if day is None.
+    """
+    if day is None:
+        return DONATIONS
+    if isinstance(day, int):
+        return f'{DONATIONS}:{day:04d}'
+    return f'{DONATIONS}:{day:%Y-%m}'
+
+
+def invalidate_donations(*days):
+    """Stage generation bumps for the all-time, year and month periods containing days."""
+    names = {DONATIONS}
+    for day in days:
+        names.add(donation_generation(day.year))
+        names.add(donation_generation(day))
+    bump_generation(*sorted(names))
+
+
+def invalidate_catalog():
+    """Stage a catalogue generation bump and drop this process's cached entries."""
+    bump_generation(CATALOG)
+    catalog_cache().clear()
+
+
+def get_catalog():
+    """
+    Return the type/subtype catalogue:
+    {'types': {type_id: type_name}, 'subtypes': {subtype_id: (type_id, subtype_name)}}
+    """
+    cache = catalog_cache()
+    key = (get_generation(CATALOG), 'catalog')
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = {
+            'types': dict(db.session.query(Type.type_id, Type.type_name)),
+            'subtypes': {
+                subtype_id: (type_id, subtype_name)
+                for subtype_id, type_id, subtype_name
+                in db.session.query(Subtype.subtype_id, Subtype.type_id, Subtype.subtype_name)
+            },
+        }
+        cache.put(key, catalog)
+    return catalog
+
+
+def catalog_response(build):
+    """
+    Serve a catalogue list endpoint from the cache, with an ETag.
+
+    build() returns the JSON body text and is only called on a cache miss.
+    Clients sending a matching If-None-Match get a 304 without a body.
+    """
+    generation = get_generation(CATALOG)
+    etag = f'catalog-{generation}'
+    # Weak comparison: compressed responses carry the tag as W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        cache = catalog_cache()
+        key = (generation, request.endpoint, tuple(sorted(request.args.items(multi=True))))
+        body = cache.get(key)
+        if body is None:
+            body = build()
+            cache.put(key, body)
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
@@ -1,43 +1,209 @@
 from donman.model import Type, Staff, Subtype
 from werkzeug.security import generate_password_hash
 from donman.controller import db
+from donman.cache import invalidate_catalog
+from donman.ledger import find_drift, rebuild_ledger, rebuild_rollup
+from donman.serve import Supervisor
+from donman.search import include_object, rebuild_donor_search
+from donman.donor_import import DONOR_IMPORT_FORMATS, import_donors, read_records
+from donman.seed import SEED_PASSWORD, seed_database
+from donman.snapshot import write_snapshot
+from donman.export import EXPORT_FORMATS, EXPORT_TABLES, export_chunks, parse_date_bound
+from flask import current_app
+from flask.cli import AppGroup, ScriptInfo
+import os
 import click
-from donman import app as current_app
 
-@current_app.cli.command("init-db")
+# Commands of the ``flask`` CLI, added to app.cli by init_cli. Their callbacks run
+# inside the app context (see flask.cli.AppGroup).
+cli = AppGroup("donman")
+
+
+def init_cli(app):
+    """Add the commands and Flask-Migrate's ``flask db`` group to app.cli."""
+    from flask_migrate import Migrate
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    # Autogenerate must not drop the donor search tables, which are not in the metadata
+    Migrate(app, db, include_object=include_object)
+
+@cli.command("init-db")
 def init_db_command():
     """Initialize the database with initial data."""
     try:
-        with current_app.app_context():
-            # Check if initial data already exists
-            if not Type.query.filter_by(type_name="other").first():
-                # Create initial data if it doesn't exist
-                type_other = Type(type_name="other")
-                db.session.add(type_other)
-                db.session.commit()
+        # Check if initial data already exists
+        if not Type.query.filter_by(type_name="other").first():
+            # Create initial data if it doesn't exist
+            type_other = Type(type_name="other")
+            db.session.add(type_other)
+            db.session.commit()
                 
 
-                new_subtype = Subtype(type_id=type_other.type_id, subtype_name="other")
-                db.session.add(new_subtype)
+            new_subtype = Subtype(type_id=type_other.type_id, subtype_name="other")
+            db.session.add(new_subtype)
+            invalidate_catalog()
                 
-                db.session.commit()
-
-                click.echo("Added initial data 'other'.")
-            else:
-                click.echo("initial data 'other' already exists. Skipping.")
-
-            if not Staff.query.filter_by(staff_email=current_app.config["ADMIN_EMAIL"]).first():
-                # Create admin staff if it doesn't exist
-                hashed_password = generate_password_hash(current_app.config["ADMIN_PASSWORD"])
-                init_staff = Staff(
-                    staff_email=current_app.config["ADMIN_EMAIL"],
-                    staff_password_hashed=hashed_password,
-                    staff_name=current_app.config["ADMIN_NAME"]
-                )
-                db.session.add(init_staff)
-                db.session.commit()
-                click.echo("Added admin staff.")
-            else:
-                click.echo("Admin staff already exists. Skipping.")
+            db.session.commit()
+
+            click.echo("Added initial data 'other'.")
+        else:
+            click.echo("initial data 'other' already exists. Skipping.")
+
+        if not Staff.query.filter_by(staff_email=current_app.config["ADMIN_EMAIL"]).first():
+            # Create admin staff if it doesn't exist
+            hashed_password = generate_password_hash(
+                current_app.config["ADMIN_PASSWORD"], method=current_app.config["PASSWORD_HASH_METHOD"])
+            init_staff = Staff(
+                staff_email=current_app.config["ADMIN_EMAIL"],
+                staff_password_hashed=hashed_password,
+                staff_name=current_app.config["ADMIN_NAME"]
+            )
+            db.session.add(init_staff)
+            db.session.commit()
+            click.echo("Added admin staff.")
+        else:
+            click.echo("Admin staff already exists. Skipping.")
     except Exception as e:
         click.echo(f"An error occurred during database initialization: {str(e)}")
+
+@cli.command("rebuild-ledger")
+@click.option("--check-only", is_flag=True, help="Only report drift, do not rewrite the ledger.")
+def rebuild_ledger_command(check_only):
+    """Rebuild the inventory ledger from the raw donation and distribution rows."""
+    drift = find_drift()
+    for subtype_id, actual, expected in drift:
+        click.echo(f"subtype {subtype_id}: ledger {actual} != raw {expected}")
+    if check_only:
+        if drift:
+            raise click.ClickException(f"{len(drift)} ledger row(s) out of date.")
+        click.echo("Ledger matches raw rows.")
+        return
+
+    try:
+        count = rebuild_ledger()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"An error occurred while rebuilding the ledger: {str(e)}")
+
+    remaining = find_drift()
+    if remaining:
+        raise click.ClickException(f"{len(remaining)} ledger row(s) still differ after rebuild.")
+    click.echo(f"Rebuilt ledger for {count} subtype(s); verified against raw rows.")
+
+@cli.command("export")
+@click.argument("table", type=click.Choice(sorted(EXPORT_TABLES)))
+@click.argument("output", type=click.File("w", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="csv", show_default=True)
+@click.option("--start", help="Only rows on or after this ISO date/datetime.")
+@click.option("--end", help="Only rows up to this ISO date/datetime (a plain date includes the whole day).")
+@click.option("--subtype-id", type=int, help="Only rows of this subtype.")
+def export_command(table, output, fmt, start, end, subtype_id):
+    """Stream the donations or distributions table to OUTPUT ('-' for stdout)."""
+    try:
+        start = parse_date_bound(start)
+        end = parse_date_bound(end, inclusive_end=True)
+    except ValueError:
+        raise click.BadParameter("start and end must be ISO 8601 dates")
+
+    for chunk in export_chunks(table, fmt, start=start, end=end, subtype_id=subtype_id):
+        output.write(chunk)
+
+@cli.command("rebuild-rollup")
+def rebuild_rollup_command():
+    """Backfill the daily rollup used by the time-series report from the raw rows."""
+    try:
+        count = rebuild_rollup()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"An error occurred while rebuilding the rollup: {str(e)}")
+    click.echo(f"Rebuilt daily rollup: {count} day/subtype row(s).")
+
+@cli.command("seed")
+@click.option("--donors", type=int, default=10000, show_default=True)
+@click.option("--donations", type=int, default=100000, show_default=True)
+@click.option("--distributions", type=int, help="Defaults to a quarter of --donations.")
+@click.option("--types", type=int, default=10, show_default=True)
+@click.option("--subtypes-per-type", type=int, default=5, show_default=True)
+@click.option("--staff", type=int, default=10, show_default=True)
+@click.option("--years", type=int, default=3, show_default=True, help="Span of donation dates, ending today.")
+@click.option("--seed", "random_seed", type=int, default=0, show_default=True, help="Random seed.")
+def seed_command(donors, donations, distributions, types, subtypes_per_type, staff, years, random_seed):
+    """Fill the database with deterministic synthetic data for scale testing."""
+    def progress(table, count):
+        click.echo(f"  {table}: {count} rows")
+
+    try:
+        counts = seed_database(
+            donors=donors, donations=donations, distributions=distributions, types=types,
+            subtypes_per_type=subtypes_per_type, staff=staff, years=years,
+            random_seed=random_seed, progress=progress)
+    except Exception as e:
+        db.session.rollback()
+        # Report the driver error without the (possibly huge) parameter list
+        raise click.ClickException(f"An error occurred while seeding: {getattr(e, 'orig', e)}")
+    click.echo("Seeded " + ", ".join(f"{count} {table}" for table, count in counts.items())
+               + f". Seed staff password: {SEED_PASSWORD!r}.")
+
+@cli.command("serve", with_appcontext=False)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option("--workers", type=int, default=os.cpu_count() or 1, show_default=True,
+              help="Number of worker processes.")
+@click.option("--threaded/--no-threaded", default=True, show_default=True,
+              help="Handle each worker's requests in threads.")
+@click.option("--graceful-timeout", type=float, default=30, show_default=True,
+              help="Seconds workers get to finish in-flight requests on shutdown.")
+def serve_command(host, port, workers, threaded, graceful_timeout):
+    """Serve the app with pre-forked worker processes sharing one socket."""
+    if not hasattr(os, "fork"):
+        raise click.ClickException("flask serve needs os.fork; use flask run on this platform.")
+    if workers < 1:
+        raise click.BadParameter("must be at least 1", param_hint="--workers")
+    app = click.get_current_context().ensure_object(ScriptInfo).load_app()
+    Supervisor(app, host, port, workers, threaded=threaded,
+               graceful_timeout=graceful_timeout, log=click.echo).run()
+
+@cli.command("rebuild-donor-search")
+def rebuild_donor_search_command():
+    """Create the donor full-text index if needed and re-index every donor."""
+    try:
+        count = rebuild_donor_search()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"An error occurred while rebuilding the donor search index: {e}")
+    click.echo(f"Indexed {count} donors.")
+
+@cli.command("import-donors")
+@click.argument("input", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(DONOR_IMPORT_FORMATS), default="csv", show_default=True,
+              help="CSV with donor_name and donor_email columns, or one JSON object per line.")
+@click.option("--show-errors", type=int, default=10, show_default=True,
+              help="Number of rejected records to list.")
+def import_donors_command(input, fmt, show_errors):
+    """Insert or update donors from INPUT ('-' for stdin), matched by normalised email."""
+    try:
+        counts, errors = import_donors(read_records(input, fmt))
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"An error occurred while importing donors: {getattr(e, 'orig', e)}")
+    # Record numbers are 1-based and count data rows, not the CSV header
+    for error in errors[:show_errors]:
+        click.echo(f"record {error['index'] + 1}: {error['error']}", err=True)
+    click.echo(", ".join(f"{count} {outcome}" for outcome, count in counts.items()) + ".")
+
+@cli.command("snapshot")
+@click.argument("output", type=click.Path(file_okay=False))
+def snapshot_command(output):
+    """Write donations and distributions as memory-mappable column files to OUTPUT (see donman.analytics)."""
+    def progress(table, count):
+        click.echo(f"  {table}: {count} rows")
+
+    try:
+        manifest = write_snapshot(output, progress=progress)
+    except Exception as e:
+        raise click.ClickException(f"An error occurred while writing the snapshot: {getattr(e, 'orig', e)}")
+    click.echo(f"Wrote snapshot to {output}: "
+               + ", ".join(f"{info['rows']} {table}" for table, info in manifest['tables'].items()) + ".")
@@ -0,0 +1,88 @@
+"""Conditional GET and gzip/deflate compression of response bodies.
+
+Every buffered 200 response to a GET gets a strong ETag (a hash of its body) unless
+the view already set one, e.g. catalog_response's generation tag, and a request
+whose If-None-Match still matches gets a 304 without a body. The body is still
+built, but not sent again over a slow link.
+
+Bodies of compressible types are then compressed with gzip or deflate, whichever
+the client prefers in Accept-Encoding: buffered bodies from COMPRESS_MIN_SIZE bytes
+on, and streamed bodies (exports, ?all=true lists) always, chunk by chunk as they
+are produced, so streaming keeps its flat memory use. A compressed response's ETag
+is marked weak, as it no longer names the identity bytes; If-None-Match uses the
+weak comparison, so clients revalidate with either form.
+"""
+import zlib
+from flask import request
+
+# Content types worth compressing
+COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+# zlib window bits selecting the container of each content coding
+_WBITS = {'gzip': 31, 'deflate': 15}
+
+
+def _compressor(encoding, level):
+    return zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+
+
+def _compress_chunks(original, chunks, encoding, level):
+    """Compress byte chunks, flushing after each one so the client gets it right away."""
+    compressor = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        # Response.close() now closes this generator; pass that on to the view's iterable
+        close = getattr(original, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, min_size, level):
+    """Compress response in place if the client accepts gzip or deflate and it is worth it."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in response.headers):
+        return
+    # The body now depends on Accept-Encoding, also for clients that got it uncompressed
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(list(_WBITS))
+    if encoding is None:
+        return
+
+    if response.is_streamed:
+        original = response.response
+        response.response = _compress_chunks(original, response.iter_encoded(), encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return
+        compressor = _compressor(encoding, level)
+        response.set_data(compressor.compress(body) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    """Install the after_request hook adding ETags, 304s and compression."""
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    level = app.config['COMPRESS_LEVEL']
+    enabled = app.config['COMPRESS_ENABLED']
+
+    @app.after_request
+    def conditional_and_compress(response):
+        # Streamed bodies are neither hashed nor made conditional, which would buffer them
+        if (request.method in ('GET', 'HEAD') and response.status_code == 200
+                and not response.is_streamed and not response.direct_passthrough):
+            response.add_etag()
+            # Turns the response into a 304 when If-None-Match/If-Modified-Since match
+            response.make_conditional(request)
+        if enabled:
+            compress_response(response, min_size, level)
+        return response
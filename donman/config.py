@@ -14,6 +14,69 @@ class Config:
     DONMAN_ROOT = pathlib.Path(__file__).resolve().parent.parent
     DATABASE_FILENAME = DONMAN_ROOT/'var'/'donman.sqlite3'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(DATABASE_FILENAME)
+    # Connection pool sizing, added to SQLALCHEMY_ENGINE_OPTIONS when the engine uses
+    # a QueuePool (file databases); in-memory SQLite uses a pool without these options
+    SQLALCHEMY_POOL_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+    }
+    # PRAGMAs run on every new SQLite connection. WAL lets report readers proceed
+    # while an intake writer holds the write lock; busy_timeout (ms) makes writers
+    # wait for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -65536,       # negative: KiB, i.e. 64 MiB of page cache
+        'mmap_size': 268435456,     # 256 MiB
+        'temp_store': 'MEMORY',
+    }
+    # Blueprints (modules of donman.controller) served by this process, e.g.
+    # ['report', 'metrics'] for a report-only worker; None serves all of them
+    BLUEPRINTS = None
     ADMIN_EMAIL = "admin@admin.com"
     ADMIN_NAME = "admin"
     ADMIN_PASSWORD = "admin"
+    # Maximum number of records accepted by the bulk ingestion endpoints, and of
+    # donor_ids per batch donor report
+    BATCH_MAX_RECORDS = 10000
+    # Page size of the list endpoints when ?limit= is not given, and its upper bound
+    PAGE_LIMIT_DEFAULT = 100
+    PAGE_LIMIT_MAX = 1000
+    # Number of donors returned by /donor/search when ?limit= is not given
+    SEARCH_LIMIT_DEFAULT = 20
+    # Reject distributions that exceed the remaining stock of their subtype (409)
+    ENFORCE_STOCK = False
+    # Maximum number of cached type/subtype catalogue entries per process
+    CATALOG_CACHE_SIZE = 256
+    # Maximum number of cached donor leaderboards per process, and the largest ?n=
+    LEADERBOARD_CACHE_SIZE = 128
+    LEADERBOARD_MAX = 100
+    # Maximum number of cached type/subtype/donor reports. With REPORT_CACHE_PATH set
+    # (e.g. DONMAN_ROOT/'var'/'report_cache.sqlite3') they are kept in that SQLite file
+    # and shared by all worker processes instead of per process.
+    REPORT_CACHE_SIZE = 4096
+    REPORT_CACHE_PATH = None
+    # Compress JSON/CSV/text responses with gzip or deflate when the client accepts it:
+    # buffered bodies of at least COMPRESS_MIN_SIZE bytes, and all streamed ones
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    # Password hashing: full werkzeug method spec including the cost parameters.
+    # Stored hashes made with a different spec are re-hashed on the next login.
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    # Worker processes used for hashing (0 hashes on the request thread), and how
+    # long a request waits for a free slot or a result, in seconds
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_TIMEOUT = 10
+    # Per-endpoint request metrics served at /api/metrics. Each worker process writes
+    # its totals to METRICS_DIR at most every METRICS_FLUSH_SECONDS.
+    METRICS_ENABLED = True
+    METRICS_DIR = DONMAN_ROOT/'var'/'metrics'
+    METRICS_FLUSH_SECONDS = 5
+    # Development/staging query diagnostics: log statements slower than SLOW_QUERY_MS
+    # and requests running the same statement more than N_PLUS_ONE_THRESHOLD times
+    QUERY_DEBUG = False
+    SLOW_QUERY_MS = 100
+    N_PLUS_ONE_THRESHOLD = 10
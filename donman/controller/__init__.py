@@ -1,9 +1,73 @@
 """REST API."""
+import importlib
 from flask import Flask
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from ..config import Config
 from flask_sqlalchemy import SQLAlchemy
 from ..model import db
-def create_app():
+
+# Blueprint modules of this package; each module <name> defines <name>_bp
+BLUEPRINTS = ('donation', 'type', 'distribution', 'donor', 'report', 'staff', 'export', 'metrics')
+
+
+class DeferredCLI(AppGroup):
+    """
+    app.cli that adds the ``flask`` commands (donman.cli) and migrations on first use.
+
+    Importing the command modules and Flask-Migrate (alembic) is a large part of the
+    startup time, which processes that only serve requests never need.
+    """
+
+    def __init__(self, app):
+        super().__init__(app.name)
+        self._app = app
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            from ..cli import init_cli
+            init_cli(self._app)
+
+    def get_command(self, ctx, name):
+        self._load()
+        return super().get_command(ctx, name)
+
+    def list_commands(self, ctx):
+        self._load()
+        return super().list_commands(ctx)
+
+
+def _apply_pool_options(app):
+    """Add SQLALCHEMY_POOL_OPTIONS to the engine options if the engine will use a QueuePool."""
+    options = app.config.get('SQLALCHEMY_POOL_OPTIONS') or {}
+    engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    pool_class = engine_options.get('poolclass') or url.get_dialect().get_pool_class(url)
+    if options and issubclass(pool_class, QueuePool):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **engine_options}
+
+
+def _set_sqlite_pragmas(app):
+    """Run the configured SQLITE_PRAGMAS on every new connection of the app's engine."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def create_app(config=None):
     # app is a single object used by all the code modules in this package
     app = Flask(__name__)  # pylint: disable=invalid-name
 
@@ -18,23 +82,34 @@ def create_app():
     # $ export INSTA485_SETTINGS=secret_key_config.py
     app.config.from_envvar('DONMAN_SETTINGS', silent=True)
 
+    # Overlay settings passed in directly, e.g. a scratch database for benchmarks
+    if config:
+        app.config.from_mapping(config)
+
 
+    blueprints = app.config['BLUEPRINTS']
+    blueprints = BLUEPRINTS if blueprints is None else tuple(blueprints)
+    unknown = set(blueprints) - set(BLUEPRINTS)
+    if unknown:
+        raise ValueError(f"Unknown blueprints {sorted(unknown)}; expected some of {BLUEPRINTS}")
+
+    _apply_pool_options(app)
     db.init_app(app)
-    
-    
-    # Register donations blueprint
-    from .donation import donation_bp
-    from .type import type_bp
-    from .distribution import distribution_bp
-    from .donor import donor_bp
-    from .report import report_bp
-    from .staff import staff_bp
-    app.register_blueprint(donation_bp, url_prefix='/api')
-    app.register_blueprint(type_bp, url_prefix='/api')
-    app.register_blueprint(distribution_bp, url_prefix='/api')
-    app.register_blueprint(donor_bp, url_prefix='/api')
-    app.register_blueprint(report_bp, url_prefix='/api')
-    app.register_blueprint(staff_bp, url_prefix='/api')
-    
+    app.cli = DeferredCLI(app)
+    _set_sqlite_pragmas(app)
+    if app.config['METRICS_ENABLED']:
+        from ..metrics import init_metrics
+        init_metrics(app)
+    if app.config['QUERY_DEBUG']:
+        from ..querylog import init_querylog
+        init_querylog(app)
+    from ..compression import init_compression
+    init_compression(app)
+
+    # Import and register only the configured blueprints. donman.search, which adds the
+    # donor_fts DDL to db.create_all(), comes with the donor blueprint and the CLI.
+    for name in blueprints:
+        module = importlib.import_module(f'.{name}', __name__)
+        app.register_blueprint(getattr(module, f'{name}_bp'), url_prefix='/api')
 
     return app
\ No newline at end of file
@@ -1,6 +1,11 @@
-from flask import request, jsonify, session, abort, Blueprint
-from donman.model import Distribution
+from collections import defaultdict
+from datetime import datetime
+from flask import request, jsonify, session, abort, Blueprint, current_app
+from donman.model import Distribution, Subtype
 from donman.controller import db
+from donman.controller.donation import _parse_positive_int
+from donman.ledger import InsufficientStock, record_distribution
+from donman.cache import invalidate_reports
 
 distribution_bp = Blueprint('distribution', __name__)
 
@@ -21,11 +26,16 @@ def register_distribution():
         "distribution_amount": "int"     // The amount of distribution
     }
 
+    When ENFORCE_STOCK is set, the distribution is rejected unless the subtype has at least
+    distribution_amount remaining; the stock check and the decrement are one atomic update.
+
     Response format:
     Status codes:
     - 200 OK: Distribution entry registered successfully.
-    - 400 Bad Request: Missing required fields or incorrect data formats.
+    - 400 Bad Request: Missing required fields, incorrect data formats, an amount that is not a
+      positive integer, or an unknown subtype.
     - 401 Unauthorized: User is not authenticated.
+    - 409 Conflict: ENFORCE_STOCK is set and the subtype does not have enough stock.
 
     Returns a JSON object with a success or error message and suitable HTTP status code.
     """
@@ -40,14 +50,34 @@ def register_distribution():
         distribution_amount = data.get("distribution_amount")
         if not all([subtype_id, distribution_amount]):
             return jsonify({'error': 'Missing required fields'}), 400
+        # A zero or negative amount would raise the stock instead of drawing on it
+        subtype_id = _parse_positive_int(subtype_id)
+        distribution_amount = _parse_positive_int(distribution_amount)
+        if subtype_id is None or distribution_amount is None:
+            return jsonify({'error': 'Invalid data format'}), 400
+        # The ledger is keyed by subtype, so check the reference before writing to it
+        if db.session.get(Subtype, subtype_id) is None:
+            return jsonify({'error': f'Unknown subtype_id {subtype_id}'}), 400
+
+        # Keep the inventory ledger in step within the same transaction; with enforced
+        # stock this is the conditional decrement, so it runs before the insert
+        distribution_date = datetime.now()
+        try:
+            record_distribution(subtype_id, distribution_amount, day=distribution_date.date(),
+                                enforce_stock=current_app.config['ENFORCE_STOCK'])
+        except InsufficientStock:
+            db.session.rollback()
+            return jsonify({'error': 'Insufficient stock', 'subtype_id': subtype_id}), 409
 
         # Create a new distribution record
         new_distribution = Distribution(
             staff_id=session['staff_id'],
             subtype_id=subtype_id,
+            distribution_date=distribution_date,
             distribution_amount=distribution_amount
         )
         db.session.add(new_distribution)
+        invalidate_reports(subtype_ids=[subtype_id])
         db.session.commit()
 
         # Return successful response
@@ -61,3 +91,125 @@ def register_distribution():
         
         # Return a generic error message to the client
         return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@distribution_bp.route('/distribution/batch', methods=['POST'])
+def register_distribution_batch():
+    """
+    Register many distribution entries in a single transaction.
+
+    Every record is validated first; the valid ones are inserted with one multi-row INSERT
+    and the inventory ledger is updated in the same transaction. Invalid records are
+    skipped and reported back by their position in the request array.
+
+    When ENFORCE_STOCK is set, the records of each subtype are checked against its
+    remaining stock together: if their total exceeds it, all of them are skipped and
+    reported with an "Insufficient stock" error.
+
+    The user must be authenticated (a 'staff_id' must be present in the session); all
+    distributions are attributed to that staff member.
+
+    Request format:
+    Content-Type: application/json
+    [
+        {
+            "subtype_id": "int",
+            "distribution_amount": "int"
+        },
+        ...
+    ]
+
+    Response format:
+    {
+        "message": "Distribution entries registered successfully",
+        "distribution_ids": [int, ...],              // IDs of the inserted rows, in request order
+        "errors": [{"index": int, "error": "string"}, ...]
+    }
+
+    Status codes:
+    - 200 OK: At least one distribution entry was registered.
+    - 400 Bad Request: The payload is not a non-empty array, is too large, or no record is valid
+      (including records rejected for insufficient stock).
+    - 401 Unauthorized: User is not authenticated.
+    - 500 Internal Server Error: The transaction failed; nothing was inserted.
+    """
+    if 'staff_id' not in session:
+        abort(401, description='Unauthorized: User must be logged in.')
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Expected a non-empty array of distribution records'}), 400
+    if len(data) > current_app.config['BATCH_MAX_RECORDS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_RECORDS']} records per batch"}), 400
+
+    try:
+        # Parse every record before touching the database
+        errors = []
+        parsed = []
+        for index, record in enumerate(data):
+            if not isinstance(record, dict):
+                errors.append({'index': index, 'error': 'Record must be an object'})
+                continue
+            subtype_id = _parse_positive_int(record.get("subtype_id"))
+            distribution_amount = _parse_positive_int(record.get("distribution_amount"))
+            if subtype_id is None or distribution_amount is None:
+                errors.append({'index': index, 'error': 'Missing required fields or invalid data format'})
+                continue
+            parsed.append((index, subtype_id, distribution_amount))
+
+        # Check referenced subtypes with one query
+        subtype_ids = {row[1] for row in parsed}
+        known_subtypes = {subtype_id for (subtype_id,) in db.session.query(Subtype.subtype_id)
+                          .filter(Subtype.subtype_id.in_(subtype_ids))} if subtype_ids else set()
+
+        staff_id = session['staff_id']
+        distribution_date = datetime.now()
+        rows = []
+        ledger_deltas = defaultdict(int)
+        for index, subtype_id, distribution_amount in parsed:
+            if subtype_id not in known_subtypes:
+                errors.append({'index': index, 'error': f'Unknown subtype_id {subtype_id}'})
+                continue
+            rows.append((index, {
+                'staff_id': staff_id,
+                'subtype_id': subtype_id,
+                'distribution_date': distribution_date,
+                'distribution_amount': distribution_amount,
+            }))
+            ledger_deltas[subtype_id] += distribution_amount
+
+        # Update the ledger first so that, with enforced stock, subtypes without enough
+        # remaining are dropped before anything is inserted
+        for subtype_id, amount in ledger_deltas.items():
+            try:
+                record_distribution(subtype_id, amount, day=distribution_date.date(),
+                                    enforce_stock=current_app.config['ENFORCE_STOCK'])
+            except InsufficientStock:
+                errors.extend({'index': index, 'error': f'Insufficient stock for subtype_id {subtype_id}'}
+                              for index, row in rows if row['subtype_id'] == subtype_id)
+                rows = [(index, row) for index, row in rows if row['subtype_id'] != subtype_id]
+        errors.sort(key=lambda error: error['index'])
+
+        if not rows:
+            db.session.rollback()
+            return jsonify({'error': 'No valid distribution records', 'errors': errors}), 400
+
+        # Insert all rows in the same transaction as the ledger updates
+        result = db.session.execute(db.insert(Distribution).returning(Distribution.distribution_id),
+                                    [row for _, row in rows])
+        # SQLite hands out rowids in increasing order within the write transaction, so
+        # sorting the returned IDs lines them up with the request order
+        distribution_ids = sorted(result.scalars().all())
+        invalidate_reports(subtype_ids={row['subtype_id'] for _, row in rows})
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Distribution entries registered successfully',
+            'distribution_ids': distribution_ids,
+            'errors': errors
+        }), 200
+
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Failed to register distribution batch')
+        return jsonify({'error': 'An unexpected error occurred'}), 500
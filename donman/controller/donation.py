@@ -1,6 +1,10 @@
-from flask import request, jsonify, session, abort, Blueprint
-from donman.model import Donation
+from collections import defaultdict
+from datetime import datetime
+from flask import request, jsonify, session, abort, Blueprint, current_app
+from donman.model import Donation, Donor, Subtype
 from donman.controller import db
+from donman.ledger import record_donation
+from donman.cache import invalidate_donations, invalidate_reports
 
 donation_bp = Blueprint('donation', __name__)
 
@@ -23,7 +27,8 @@ def register_donation():
     Response format:
     Status codes:
     - 200 OK: Donation entry registered successfully.
-    - 400 Bad Request: Missing required fields or incorrect data formats.
+    - 400 Bad Request: Missing required fields, incorrect data formats, an ID or quantity that
+      is not a positive integer, or an unknown donor or subtype.
     - 401 Unauthorized: User is not authenticated.
 
     Returns a JSON object with a success or error message and suitable HTTP status code.
@@ -40,15 +45,31 @@ def register_donation():
         subtype_id = data.get("subtype_id")
         if not all([donor_id, donation_quantity, subtype_id]):
             return jsonify({'error': 'Missing required fields'}), 400
+        # A zero or negative quantity would draw the stock down instead of adding to it
+        donor_id = _parse_positive_int(donor_id)
+        donation_quantity = _parse_positive_int(donation_quantity)
+        subtype_id = _parse_positive_int(subtype_id)
+        if None in (donor_id, donation_quantity, subtype_id):
+            return jsonify({'error': 'Invalid data format'}), 400
+        # The ledger is keyed by subtype, so check the references before writing to it
+        if db.session.get(Donor, donor_id) is None:
+            return jsonify({'error': f'Unknown donor_id {donor_id}'}), 400
+        if db.session.get(Subtype, subtype_id) is None:
+            return jsonify({'error': f'Unknown subtype_id {subtype_id}'}), 400
 
         # Create a new donation record
         new_donation = Donation(
             donor_id=donor_id,
             staff_id=session['staff_id'],  # Extract staff_id from session
+            donation_date=datetime.now(),
             donation_quantity=donation_quantity,
             subtype_id=subtype_id
         )
         db.session.add(new_donation)
+        # Keep the inventory ledger in step within the same transaction
+        record_donation(subtype_id, donation_quantity, day=new_donation.donation_date.date())
+        invalidate_donations(new_donation.donation_date.date())
+        invalidate_reports(subtype_ids=[subtype_id], donor_ids=[donor_id])
         db.session.commit()
 
         # Return successful response
@@ -65,3 +86,128 @@ def register_donation():
 
         # Return a generic error message to the client
         return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+def _parse_positive_int(value):
+    """Return value as a positive int, or None if it is not one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+@donation_bp.route('/donation/batch', methods=['POST'])
+def register_donation_batch():
+    """
+    Register many donation entries in a single transaction.
+
+    Every record is validated first; the valid ones are inserted with one multi-row INSERT
+    and the inventory ledger is updated in the same transaction. Invalid records are
+    skipped and reported back by their position in the request array.
+
+    The user must be authenticated (a 'staff_id' must be present in the session); all
+    donations are attributed to that staff member.
+
+    Request format:
+    Content-Type: application/json
+    [
+        {
+            "donor_id": "integer",
+            "donation_quantity": "integer",
+            "subtype_id": "integer"
+        },
+        ...
+    ]
+
+    Response format:
+    {
+        "message": "Donation entries registered successfully",
+        "donation_ids": [int, ...],                  // IDs of the inserted rows, in request order
+        "errors": [{"index": int, "error": "string"}, ...]
+    }
+
+    Status codes:
+    - 200 OK: At least one donation entry was registered.
+    - 400 Bad Request: The payload is not a non-empty array, is too large, or no record is valid.
+    - 401 Unauthorized: User is not authenticated.
+    - 500 Internal Server Error: The transaction failed; nothing was inserted.
+    """
+    if 'staff_id' not in session:
+        abort(401, description='Unauthorized: User must be logged in.')
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Expected a non-empty array of donation records'}), 400
+    if len(data) > current_app.config['BATCH_MAX_RECORDS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_RECORDS']} records per batch"}), 400
+
+    try:
+        # Parse every record before touching the database
+        errors = []
+        parsed = []
+        for index, record in enumerate(data):
+            if not isinstance(record, dict):
+                errors.append({'index': index, 'error': 'Record must be an object'})
+                continue
+            fields = [_parse_positive_int(record.get(name))
+                      for name in ("donor_id", "donation_quantity", "subtype_id")]
+            if None in fields:
+                errors.append({'index': index, 'error': 'Missing required fields or invalid data format'})
+                continue
+            parsed.append((index, *fields))
+
+        # Check referenced donors and subtypes with one query each
+        donor_ids = {row[1] for row in parsed}
+        subtype_ids = {row[3] for row in parsed}
+        known_donors = {donor_id for (donor_id,) in db.session.query(Donor.donor_id)
+                        .filter(Donor.donor_id.in_(donor_ids))} if donor_ids else set()
+        known_subtypes = {subtype_id for (subtype_id,) in db.session.query(Subtype.subtype_id)
+                          .filter(Subtype.subtype_id.in_(subtype_ids))} if subtype_ids else set()
+
+        staff_id = session['staff_id']
+        donation_date = datetime.now()
+        rows = []
+        ledger_deltas = defaultdict(int)
+        for index, donor_id, donation_quantity, subtype_id in parsed:
+            if donor_id not in known_donors:
+                errors.append({'index': index, 'error': f'Unknown donor_id {donor_id}'})
+            elif subtype_id not in known_subtypes:
+                errors.append({'index': index, 'error': f'Unknown subtype_id {subtype_id}'})
+            else:
+                rows.append({
+                    'donor_id': donor_id,
+                    'staff_id': staff_id,
+                    'donation_date': donation_date,
+                    'donation_quantity': donation_quantity,
+                    'subtype_id': subtype_id,
+                })
+                ledger_deltas[subtype_id] += donation_quantity
+        errors.sort(key=lambda error: error['index'])
+
+        if not rows:
+            return jsonify({'error': 'No valid donation records', 'errors': errors}), 400
+
+        # Insert all rows and update the ledger in one transaction
+        result = db.session.execute(db.insert(Donation).returning(Donation.donation_id), rows)
+        # SQLite hands out rowids in increasing order within the write transaction, so
+        # sorting the returned IDs lines them up with the request order
+        donation_ids = sorted(result.scalars().all())
+        for subtype_id, quantity in ledger_deltas.items():
+            record_donation(subtype_id, quantity, day=donation_date.date())
+        invalidate_donations(donation_date.date())
+        invalidate_reports(subtype_ids=ledger_deltas, donor_ids={row['donor_id'] for row in rows})
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Donation entries registered successfully',
+            'donation_ids': donation_ids,
+            'errors': errors
+        }), 200
+
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Failed to register donation batch')
+        return jsonify({'error': 'An unexpected error occurred'}), 500
@@ -1,25 +1,40 @@
 """REST API for donor."""
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, session, abort
 from donman.controller import db
 from donman.model import Donor
+from donman.controller.pagination import PaginationError, Projection, json_response, paginate, prefix_filter, wants_all
+from donman.search import search_donors
+from donman.donor_import import import_donors, normalise_email
 
 donor_bp = Blueprint('donor', __name__)
 
+DONOR_FIELDS = Projection(id=Donor.donor_id, email=Donor.donor_email, name=Donor.donor_name)
+
 
 @donor_bp.route('/donor', methods=['GET'])
 def get_donors():
     """
-    Retrieve a list of all registered donors in the system.
+    Retrieve a page of registered donors, ordered by donor ID.
 
-    No request parameters are required.
+    Query parameters (all optional):
+    - after (int): Return donors with an ID greater than this cursor (default 0).
+    - limit (int): Maximum number of donors to return.
+    - name (str): Only donors whose name starts with this prefix.
+    - email (str): Only donors whose email starts with this prefix.
+    - all (bool): "true" returns every matching donor as a plain JSON array instead of a page.
 
     Response format:
-    A JSON array of donor objects, where each object contains the donor details.
-        {
-            'id': donor_id,
-            'email': donor_email,
-            'name': donor_name,
-        }
+    {
+        "items": [
+            {
+                'id': donor_id,
+                'email': donor_email,
+                'name': donor_name,
+            },
+            ...
+        ],
+        "next": donor_id or null  // Pass as ?after= to fetch the next page
+    }
     
     On error:
     - If there is an issue retrieving donor data from the database:
@@ -29,18 +44,72 @@ def get_donors():
         }
     Status codes:
     - 200 OK: Donor data retrieved successfully.
+    - 400 Bad Request: after or limit is not a valid integer.
     - 500 Internal Server Error: An error occurred during retrieval of donor data.
 
     Returns a JSON array with the donor data and an HTTP status code.
     """
     try:
-        donors = Donor.query.all()
-        donor_data = [donor.serialize() for donor in donors]  # Ensure serialize method is well-defined
-        return jsonify(donor_data), 200
+        query = prefix_filter(Donor.query, Donor.donor_name, 'name')
+        query = prefix_filter(query, Donor.donor_email, 'email')
+        if wants_all():
+            return json_response(DONOR_FIELDS.stream(query))
+        return json_response(paginate(query, DONOR_FIELDS))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to retrieve donors', 'details': str(e)}), 500
 
 
+@donor_bp.route('/donor/search', methods=['GET'])
+def search_donor():
+    """
+    Search donors by name and email.
+
+    Every word of q must prefix-match a word of the donor's name or email, e.g.
+    "jan smi" finds "Jane Smith" and "jan@exa" finds "jane@example.com". Results are
+    ranked by relevance (bm25) using the donor_fts full-text index.
+
+    Query parameters:
+    - q (str): The search text. Required.
+    - limit (int): Maximum number of donors to return (default SEARCH_LIMIT_DEFAULT).
+
+    Response format:
+    [
+        {
+            'id': donor_id,
+            'email': donor_email,
+            'name': donor_name,
+        },
+        ...
+    ]
+
+    On error:
+        {
+            "error": "Failed to search donors",
+            "details": "Error message string here"
+        }
+    Status codes:
+    - 200 OK: Search ran successfully (the array may be empty).
+    - 400 Bad Request: q is missing or limit is not a positive integer.
+    - 500 Internal Server Error: An error occurred during the search.
+    """
+    q = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', current_app.config['SEARCH_LIMIT_DEFAULT']))
+    except ValueError:
+        limit = 0
+    if not q or limit < 1:
+        return jsonify({'error': 'Invalid data provided'}), 400
+    limit = min(limit, current_app.config['PAGE_LIMIT_MAX'])
+
+    try:
+        return jsonify(search_donors(q, limit)), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to search donors', 'details': str(e)}), 500
+
+
 @donor_bp.route('/donor', methods=['POST'])
 def register_donor():
     """
@@ -50,7 +119,7 @@ def register_donor():
     Content-Type: application/json
     {
         "donor_name": "string",   // The name of the donor
-        "donor_email": "string"   // The email of the donor
+        "donor_email": "string"   // The email of the donor; stored trimmed and lower-cased
     }
 
     Response format:
@@ -80,8 +149,11 @@ def register_donor():
         data = request.json
         if not data or 'donor_name' not in data or 'donor_email' not in data:
             return jsonify({'error': 'Invalid data provided'}), 400
+        donor_email = normalise_email(data["donor_email"])
+        if donor_email is None:
+            return jsonify({'error': 'Invalid data provided'}), 400
         
-        new_donor = Donor(donor_name=data["donor_name"], donor_email=data["donor_email"])
+        new_donor = Donor(donor_name=data["donor_name"], donor_email=donor_email)
         db.session.add(new_donor)
         db.session.commit()
         
@@ -89,3 +161,58 @@ def register_donor():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to register donor', 'details': str(e)}), 500
+
+
+@donor_bp.route('/donor/batch', methods=['POST'])
+def register_donor_batch():
+    """
+    Insert or update many donors in one request.
+
+    Emails are trimmed and lower-cased before matching. A donor whose email already
+    exists has its name updated; the first record of an email in the request wins and
+    later ones are rejected as duplicates, as are records with a missing name or an
+    invalid email. Records are written in chunked transactions.
+
+    The user must be authenticated (a 'staff_id' must be present in the session).
+
+    Request format:
+    Content-Type: application/json
+    [
+        {
+            "donor_name": "string",
+            "donor_email": "string"
+        },
+        ...
+    ]
+
+    Response format:
+    {
+        "message": "Donors imported successfully",
+        "inserted": int,      // New donors
+        "updated": int,       // Existing donors whose name changed
+        "unchanged": int,     // Existing donors already up to date
+        "rejected": int,      // Invalid or duplicate records
+        "errors": [{"index": int, "error": "string"}, ...]
+    }
+
+    Status codes:
+    - 200 OK: The valid records were imported.
+    - 400 Bad Request: The payload is not a non-empty array or is too large.
+    - 401 Unauthorized: User is not authenticated.
+    - 500 Internal Server Error: A chunk failed; earlier chunks stay imported.
+    """
+    if 'staff_id' not in session:
+        abort(401, description='Unauthorized: User must be logged in.')
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'Expected a non-empty array of donor records'}), 400
+    if len(data) > current_app.config['BATCH_MAX_RECORDS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_RECORDS']} records per batch"}), 400
+
+    try:
+        counts, errors = import_donors(data)
+        return jsonify({'message': 'Donors imported successfully', **counts, 'errors': errors}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to import donors', 'details': str(e)}), 500
@@ -0,0 +1,90 @@
+"""REST API for exporting donations and distributions."""
+from flask import Blueprint, Response, request, jsonify, session, abort, stream_with_context
+from donman.controller.donation import _parse_positive_int
+from donman.export import EXPORT_FORMATS, export_chunks, parse_date_bound
+
+export_bp = Blueprint('export', __name__)
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _export(table):
+    """Validate the export query parameters and stream the requested table."""
+    if 'staff_id' not in session:
+        abort(401, description='Unauthorized: An authenticated staff user is required.')
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start = parse_date_bound(request.args.get('start'))
+        end = parse_date_bound(request.args.get('end'), inclusive_end=True)
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 dates'}), 400
+    subtype_id = request.args.get('subtype_id')
+    if subtype_id is not None:
+        subtype_id = _parse_positive_int(subtype_id)
+        if subtype_id is None:
+            return jsonify({'error': 'subtype_id must be a positive integer'}), 400
+
+    chunks = export_chunks(table, fmt, start=start, end=end, subtype_id=subtype_id)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+    )
+
+
+@export_bp.route('/export/donations', methods=['GET'])
+def export_donations():
+    """
+    Stream all donation rows as CSV or NDJSON.
+
+    Rows are read from the database in batches and written to the response as they
+    are read, so memory use does not grow with the size of the table.
+
+    Requires an authenticated staff member.
+
+    Query parameters (all optional):
+    - format (str): "csv" (default) or "ndjson".
+    - start (str): ISO date/datetime; only donations on or after it.
+    - end (str): ISO date/datetime; only donations up to it (a plain date includes the whole day).
+    - subtype_id (int): Only donations of this subtype.
+
+    Columns: donation_id, donor_id, staff_id, subtype_id, donation_quantity, donation_date
+
+    Status codes:
+    - 200 OK: The export is streamed in the response body.
+    - 400 Bad Request: Unknown format, malformed date or malformed subtype_id.
+    - 401 Unauthorized: The user is not authenticated.
+    """
+    return _export('donations')
+
+
+@export_bp.route('/export/distributions', methods=['GET'])
+def export_distributions():
+    """
+    Stream all distribution rows as CSV or NDJSON.
+
+    Rows are read from the database in batches and written to the response as they
+    are read, so memory use does not grow with the size of the table.
+
+    Requires an authenticated staff member.
+
+    Query parameters (all optional):
+    - format (str): "csv" (default) or "ndjson".
+    - start (str): ISO date/datetime; only distributions on or after it.
+    - end (str): ISO date/datetime; only distributions up to it (a plain date includes the whole day).
+    - subtype_id (int): Only distributions of this subtype.
+
+    Columns: distribution_id, staff_id, subtype_id, distribution_amount, distribution_date
+
+    Status codes:
+    - 200 OK: The export is streamed in the response body.
+    - 400 Bad Request: Unknown format, malformed date or malformed subtype_id.
+    - 401 Unauthorized: The user is not authenticated.
+    """
+    return _export('distributions')
@@ -0,0 +1,25 @@
+"""REST API for request metrics."""
+from flask import Blueprint, Response, current_app, jsonify
+from donman.metrics import render
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Expose per-endpoint request metrics in Prometheus text format.
+
+    For every route, method and status code: request count, latency histogram, number
+    of SQL statements executed and total time spent in SQL; and hits and misses of the
+    catalogue, leaderboard and report caches. The numbers are the sum over all worker
+    processes sharing METRICS_DIR.
+
+    Status codes:
+    - 200 OK: Metrics returned as text/plain (Prometheus exposition format 0.0.4).
+    - 404 Not Found: Metrics are disabled (METRICS_ENABLED is false).
+    """
+    store = current_app.extensions.get('donman_metrics')
+    if store is None:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(render(*store.collect()), mimetype='text/plain; version=0.0.4')
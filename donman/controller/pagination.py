@@ -0,0 +1,132 @@
+"""Keyset pagination, prefix filtering and JSON encoding shared by the list endpoints.
+
+The list endpoints select only the columns they return, as plain tuples, and encode
+the JSON text straight from them with a Projection, instead of loading ORM objects
+and building a dict per row. Unpaginated lists (?all=true) are streamed.
+"""
+import json
+import sys
+from flask import request, current_app, stream_with_context
+
+# Largest value of an SQLite INTEGER; a larger ?after= cannot be bound as a parameter
+MAX_ID = 2 ** 63 - 1
+
+# Rows fetched from the cursor (and encoded into one output chunk) at a time when streaming
+STREAM_BATCH_SIZE = 1000
+
+# Compact and ASCII-only like jsonify's output; Projection sorts the keys as jsonify does
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class PaginationError(ValueError):
+    """Raised when the pagination query parameters are invalid."""
+
+
+def wants_all():
+    """Return True if the client explicitly asked for the unpaginated array (?all=true)."""
+    return request.args.get('all', '').lower() in ('1', 'true', 'yes')
+
+
+def prefix_filter(query, column, param):
+    """
+    Restrict query to rows whose column starts with the value of query parameter param.
+
+    The prefix is turned into a half-open range (prefix <= column < next prefix) rather
+    than a LIKE so that SQLite can answer it from an index on column. Trailing U+10FFFF
+    characters have no successor and are dropped from the upper bound; a prefix made
+    only of them leaves the range open above.
+    """
+    prefix = request.args.get(param)
+    if not prefix:
+        return query
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return query.filter(column >= prefix)
+    successor = ord(stem[-1]) + 1
+    if 0xD800 <= successor <= 0xDFFF:
+        # Surrogates cannot be encoded as UTF-8; the next real character is U+E000
+        successor = 0xE000
+    upper = stem[:-1] + chr(successor)
+    return query.filter(column >= prefix, column < upper)
+
+
+class Projection:
+    """
+    The JSON fields of a list endpoint and the columns they are read from.
+
+    Projection(id=Donor.donor_id, name=Donor.donor_name) encodes (donor_id, donor_name)
+    rows as {"id": ..., "name": ...} objects, matching the model's serialize(). The
+    first field is the ID the lists are ordered and paginated by.
+    """
+
+    def __init__(self, **fields):
+        names = list(fields)
+        self.columns = list(fields.values())
+        self.id_column = self.columns[0]
+        # Row positions in key order, and the object with its keys already encoded,
+        # e.g. '{"id":%s,"name":%s}'
+        self._order = sorted(range(len(names)), key=names.__getitem__)
+        self._template = '{' + ','.join(f'{_encode(names[i])}:%s' for i in self._order) + '}'
+
+    def select(self, query):
+        """Restrict query to the projected columns, ordered by the ID."""
+        return query.with_entities(*self.columns).order_by(self.id_column)
+
+    def encode_row(self, row):
+        return self._template % tuple(_encode(row[i]) for i in self._order)
+
+    def encode(self, rows):
+        """Return the JSON array text of rows."""
+        return '[' + ','.join(map(self.encode_row, rows)) + ']'
+
+    def stream(self, query):
+        """Yield the JSON array of every row of query in chunks of STREAM_BATCH_SIZE rows."""
+        stmt = self.select(query).statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+        result = query.session.execute(stmt)
+        try:
+            yield '['
+            separator = ''
+            for batch in result.partitions():
+                yield separator + ','.join(map(self.encode_row, batch))
+                separator = ','
+            yield ']'
+        finally:
+            result.close()
+
+
+def json_response(body):
+    """Return a 200 application/json response for JSON text or a generator of text chunks."""
+    if not isinstance(body, str):
+        body = stream_with_context(body)
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def paginate(query, projection):
+    """
+    Return the JSON text of one page of query, using ?after=<id>&limit=N.
+
+    Response format:
+    {
+        "items": [...],   // encoded rows, at most limit of them
+        "next": int|null  // value to pass as ?after= for the next page, null on the last page
+    }
+
+    Raises PaginationError if after or limit are not valid integers, or after is
+    outside the range of an SQLite integer.
+    """
+    try:
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', current_app.config['PAGE_LIMIT_DEFAULT']))
+    except ValueError:
+        raise PaginationError('after and limit must be integers')
+    if not -MAX_ID - 1 <= after <= MAX_ID:
+        raise PaginationError('after is out of range')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    limit = min(limit, current_app.config['PAGE_LIMIT_MAX'])
+
+    # Fetch one extra row to learn whether another page follows
+    rows = projection.select(query.filter(projection.id_column > after)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return '{"items":%s,"next":%s}' % (projection.encode(rows), _encode(rows[-1][0] if has_more else None))
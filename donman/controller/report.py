@@ -1,16 +1,73 @@
-from flask import request, jsonify, Blueprint
-from donman.model import Distribution, Donation, Type, Subtype
+from flask import request, jsonify, Blueprint, current_app
+from datetime import date, datetime
+from donman.model import Donation, Donor, Subtype, SubtypeLedger, DailyRollup
 from donman.controller import db
+from donman.cache import CATALOG, cached_reports, donation_generation, donor_generation, get_catalog, \
+    get_generation, leaderboard_cache, subtype_generation, type_generation
 
 report_bp = Blueprint('report', __name__)
 
+# SQLite expressions mapping a rollup day to the first day of its bucket
+TIMESERIES_BUCKETS = {
+    'day': lambda day: db.func.date(day),
+    'week': lambda day: db.func.date(day, 'weekday 0', '-6 days'),  # Monday of the ISO week
+    'month': lambda day: db.func.date(day, 'start of month'),
+}
+
+# Leaderboard periods: (first day, first day after) of the period containing today,
+# and the generation covering it. None bounds mean all time.
+LEADERBOARD_PERIODS = {
+    'month': lambda today: (today.replace(day=1),
+                            date(today.year + today.month // 12, today.month % 12 + 1, 1),
+                            donation_generation(today)),
+    'year': lambda today: (date(today.year, 1, 1), date(today.year + 1, 1, 1),
+                           donation_generation(today.year)),
+    'all': lambda today: (None, None, donation_generation()),
+}
+
+# Upper bound on IDs per IN (...) clause, well below SQLite's bound-parameter limit
+DONOR_ID_CHUNK = 500
+
+
+def _donor_reports(donor_ids):
+    """
+    Build donor reports for the given donor IDs with one grouped query per chunk.
+
+    Donations are grouped by donor and subtype only; type and subtype names come from
+    the cached catalogue. Returns {donor_id: {type_name: {subtype_name: donation_quantity}}};
+    donors without donations are left out.
+    """
+    catalog = get_catalog()
+    reports = {}
+    donor_ids = list(donor_ids)
+    for start in range(0, len(donor_ids), DONOR_ID_CHUNK):
+        chunk = donor_ids[start:start + DONOR_ID_CHUNK]
+        rows = db.session.query(
+                Donation.donor_id,
+                Donation.subtype_id,
+                db.func.sum(Donation.donation_quantity))\
+            .filter(Donation.donor_id.in_(chunk))\
+            .group_by(Donation.donor_id, Donation.subtype_id)
+        for donor_id, subtype_id, donation_quantity in rows:
+            if subtype_id not in catalog['subtypes']:
+                # Dangling subtype reference; an inner join would have dropped it too
+                continue
+            type_id, subtype_name = catalog['subtypes'][subtype_id]
+            type_report = reports.setdefault(donor_id, {}).setdefault(catalog['types'][type_id], {})
+            # Subtype names are only unique within a type, so the same key cannot repeat
+            type_report[subtype_name] = donation_quantity
+    return reports
+
+
 @report_bp.route('/report/type/<int:type_id>', methods=['GET'])
 def report_by_type(type_id):
     """
     Generate a report by type with the total amounts donated and distributed.
 
     This endpoint calculates aggregate donation and distribution amounts for a specific type
-    and returns the remaining quantity of resources for that type.
+    and returns the remaining quantity of resources for that type. The totals are read from
+    the per-subtype inventory ledger rather than summed from the raw rows, and the report
+    is cached until a donation or distribution of one of the type's subtypes is recorded.
 
     URL parameter:
     - type_id (int): The identifier for the type whose report is being queried.
@@ -45,24 +102,10 @@ def report_by_type(type_id):
     - HTTP 500: Raises an HTTP 500 if there is a server-side error such as database connection issue.
     """
     try:
-        # Aggregate the amount donated for the type
-        total_donated = db.session.query(db.func.sum(Donation.donation_quantity))\
-            .filter(Donation.subtype_id.in_(db.session.query(Subtype.subtype_id)\
-            .filter_by(type_id=type_id))).scalar() or 0
-        
-        # Aggregate the amount distributed for the type
-        total_distributed = db.session.query(db.func.sum(Distribution.distribution_amount))\
-            .filter(Distribution.subtype_id.in_(db.session.query(Subtype.subtype_id)\
-            .filter_by(type_id=type_id))).scalar() or 0
-        
-        # Calculate the remaining amount of the resource
-        remaining_amount = total_donated - total_distributed
+        report = cached_reports('type', [type_id], lambda _: [type_generation(type_id)],
+                                lambda _: {type_id: _type_report(type_id)})[type_id]
 
-        return jsonify({
-            'total_donated': total_donated,
-            'total_distributed': total_distributed,
-            'remaining_amount': remaining_amount
-        }), 200
+        return jsonify(report), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -76,7 +119,8 @@ def report_by_subtype(subtype_id):
     Generate a report for a specific subtype including the total amounts donated and distributed.
 
     This endpoint returns the aggregate quantities of donations and distributions for a given subtype,
-    as well as the calculated remaining amount of resources for that subtype.
+    as well as the calculated remaining amount of resources for that subtype, as kept in the
+    inventory ledger. The report is cached until the subtype's next donation or distribution.
 
     URL parameter:
     - subtype_id (int): The identifier for the subtype being queried.
@@ -104,27 +148,252 @@ def report_by_subtype(subtype_id):
     - HTTP 500: Raised if there is a server-side error, such as a database connection issue or a failed query.
     """
     try:
+        report = cached_reports('subtype', [subtype_id], lambda _: [subtype_generation(subtype_id)],
+                                lambda _: {subtype_id: _subtype_report(subtype_id)})[subtype_id]
 
-        # Aggregate the amount donated for the subtype
-        total_donated = db.session.query(db.func.sum(Donation.donation_quantity))\
-            .filter_by(subtype_id=subtype_id).scalar() or 0
-        
-        # Aggregate the amount distributed for the subtype
-        total_distributed = db.session.query(db.func.sum(Distribution.distribution_amount))\
-            .filter_by(subtype_id=subtype_id).scalar() or 0
-        
-        # Calculate the remaining amount of the resource for the subtype
-        remaining_amount = total_donated - total_distributed
+        return jsonify(report), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Failed to generate report by subtype',
+            'details': str(e)
+        }), 500
+
+
+@report_bp.route('/report/inventory', methods=['GET'])
+def report_inventory():
+    """
+    Generate stock levels for every type, with its subtypes nested.
+
+    All totals come from one query over the inventory ledger; type and subtype names
+    come from the cached catalogue, so the dashboard needs one request instead of one
+    report per type.
+
+    Query parameter (optional):
+    - in_stock (str): "true" leaves out subtypes with nothing remaining, and types left
+      without subtypes.
+
+    Response format (JSON object):
+    {
+        "types": [
+            {
+                "type_id": 1,
+                "type_name": "Food",
+                "total_donated": 150,
+                "total_distributed": 100,
+                "remaining_amount": 50,
+                "subtypes": [
+                    {
+                        "subtype_id": 1,
+                        "subtype_name": "Canned",
+                        "total_donated": 150,
+                        "total_distributed": 100,
+                        "remaining_amount": 50
+                    },
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+    Types and subtypes are ordered by ID.
+
+    On error:
+    {
+        "error": "Failed to generate inventory report",
+        "details": "Description of the error"
+    }
+
+    Status codes:
+    - 200 OK: Report data was retrieved successfully.
+    - 500 Internal Server Error: A server-side error occurred during report generation.
+    """
+    in_stock = request.args.get('in_stock', '').lower() in ('1', 'true', 'yes')
+    try:
+        catalog = get_catalog()
+        ledger = {
+            subtype_id: (total_donated, total_distributed, remaining_amount)
+            for subtype_id, total_donated, total_distributed, remaining_amount in db.session.query(
+                SubtypeLedger.subtype_id,
+                SubtypeLedger.total_donated,
+                SubtypeLedger.total_distributed,
+                SubtypeLedger.remaining_amount)
+        }
+
+        types = {
+            type_id: {
+                'type_id': type_id,
+                'type_name': type_name,
+                'total_donated': 0,
+                'total_distributed': 0,
+                'remaining_amount': 0,
+                'subtypes': []
+            }
+            for type_id, type_name in sorted(catalog['types'].items())
+        }
+        for subtype_id, (type_id, subtype_name) in sorted(catalog['subtypes'].items()):
+            total_donated, total_distributed, remaining_amount = ledger.get(subtype_id, (0, 0, 0))
+            if in_stock and remaining_amount <= 0:
+                continue
+            type_report = types[type_id]
+            type_report['total_donated'] += total_donated
+            type_report['total_distributed'] += total_distributed
+            type_report['remaining_amount'] += remaining_amount
+            type_report['subtypes'].append({
+                'subtype_id': subtype_id,
+                'subtype_name': subtype_name,
+                'total_donated': total_donated,
+                'total_distributed': total_distributed,
+                'remaining_amount': remaining_amount
+            })
 
         return jsonify({
-            'total_donated': total_donated,
-            'total_distributed': total_distributed,
-            'remaining_amount': remaining_amount
+            'types': [type_report for type_report in types.values()
+                      if not in_stock or type_report['subtypes']]
         }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({
-            'error': 'Failed to generate report by subtype',
+            'error': 'Failed to generate inventory report',
+            'details': str(e)
+        }), 500
+
+
+def _cached_donor_reports(donor_ids):
+    """
+    Return {donor_id: report} for every given donor ({} without donations), served from
+    the report cache while neither the donor's donations nor the catalogue changed.
+    """
+    def build(missing):
+        reports = _donor_reports(missing)
+        return {donor_id: reports.get(donor_id, {}) for donor_id in missing}
+
+    return cached_reports('donor', donor_ids, lambda donor_id: [CATALOG, donor_generation(donor_id)], build)
+
+
+def _type_report(type_id):
+    """Add up the precomputed ledger rows of the type's subtypes, taken from the catalogue."""
+    subtype_ids = [subtype_id for subtype_id, (subtype_type_id, _) in get_catalog()['subtypes'].items()
+                   if subtype_type_id == type_id]
+    total_donated, total_distributed = db.session.query(
+            db.func.coalesce(db.func.sum(SubtypeLedger.total_donated), 0),
+            db.func.coalesce(db.func.sum(SubtypeLedger.total_distributed), 0))\
+        .filter(SubtypeLedger.subtype_id.in_(subtype_ids)).one()
+
+    # Calculate the remaining amount of the resource
+    return {
+        'total_donated': total_donated,
+        'total_distributed': total_distributed,
+        'remaining_amount': total_donated - total_distributed
+    }
+
+
+def _subtype_report(subtype_id):
+    """Read the precomputed ledger row; a subtype without one has no activity yet."""
+    ledger = db.session.get(SubtypeLedger, subtype_id)
+    if ledger is None:
+        ledger = SubtypeLedger(total_donated=0, total_distributed=0, remaining_amount=0)
+    return ledger.serialize()
+
+
+def _top_donors(n, start, end, type_id):
+    """
+    Return [(donor_id, total_donated), ...] of the n donors with the largest donated
+    quantity between start and end, computed by one grouped query over the donation indexes.
+    """
+    total = db.func.sum(Donation.donation_quantity)
+    query = db.session.query(Donation.donor_id, total)
+    if start is not None:
+        query = query.filter(Donation.donation_date >= datetime.combine(start, datetime.min.time()),
+                             Donation.donation_date < datetime.combine(end, datetime.min.time()))
+    if type_id is not None:
+        subtype_ids = [subtype_id for subtype_id, (subtype_type_id, _) in get_catalog()['subtypes'].items()
+                       if subtype_type_id == type_id]
+        query = query.filter(Donation.subtype_id.in_(subtype_ids))
+    return query.group_by(Donation.donor_id).order_by(total.desc(), Donation.donor_id).limit(n).all()
+
+
+@report_bp.route('/report/donors/top', methods=['GET'])
+def report_top_donors():
+    """
+    Generate a leaderboard of the donors who donated the most in a period.
+
+    The ranking is cached per period, type and size, keyed by the write generation of
+    the period, so it is recomputed only after a donation was recorded in the period.
+    Donor names are looked up on every request, so renames show up immediately.
+
+    Query parameters (all optional):
+    - n (int): Number of donors, at most LEADERBOARD_MAX. Defaults to 10.
+    - period (str): "month" (this calendar month), "year" (this calendar year) or "all".
+      Defaults to "month".
+    - type_id (int): Only donations of subtypes of this type.
+
+    Response format (JSON object):
+    {
+        "period": "month",
+        "start": "2024-05-01",          // First day of the period, null for "all"
+        "end": "2024-06-01",            // First day after the period, null for "all"
+        "type_id": null,
+        "donors": [
+            {
+                "donor_id": 7,
+                "donor_name": "Jane Smith",
+                "total_donated": 420
+            },
+            ...
+        ]
+    }
+    Ties are broken by donor ID.
+
+    On error:
+    {
+        "error": "Failed to generate donor leaderboard",
+        "details": "Description of the error"
+    }
+
+    Status codes:
+    - 200 OK: Report data was retrieved successfully.
+    - 400 Bad Request: Unknown period, or n or type_id is not a valid integer.
+    - 500 Internal Server Error: A server-side error occurred during report generation.
+    """
+    period = request.args.get('period', 'month')
+    if period not in LEADERBOARD_PERIODS:
+        return jsonify({'error': f"period must be one of {', '.join(LEADERBOARD_PERIODS)}"}), 400
+    try:
+        n = int(request.args.get('n', 10))
+        type_id = request.args.get('type_id')
+        type_id = int(type_id) if type_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid data provided'}), 400
+    if n < 1:
+        return jsonify({'error': 'Invalid data provided'}), 400
+    n = min(n, current_app.config['LEADERBOARD_MAX'])
+
+    try:
+        start, end, generation_name = LEADERBOARD_PERIODS[period](date.today())
+        cache = leaderboard_cache()
+        key = (get_generation(generation_name), generation_name, type_id, n)
+        top = cache.get(key)
+        if top is None:
+            top = _top_donors(n, start, end, type_id)
+            cache.put(key, top)
+        names = dict(db.session.query(Donor.donor_id, Donor.donor_name)
+                     .filter(Donor.donor_id.in_([donor_id for donor_id, _ in top])))
+
+        return jsonify({
+            'period': period,
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'type_id': type_id,
+            'donors': [
+                {'donor_id': donor_id, 'donor_name': names.get(donor_id), 'total_donated': total_donated}
+                for donor_id, total_donated in top
+            ]
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Failed to generate donor leaderboard',
             'details': str(e)
         }), 500
 
@@ -134,7 +403,9 @@ def report_by_donor(donor_id):
     """
     Generate a report summarizing donations made by a specific donor.
 
-    The report includes a breakdown of donations grouped by type and subtype.
+    The report includes a breakdown of donations grouped by type and subtype, computed
+    by a single grouped query over the donor's donations and named from the cached
+    type/subtype catalogue. The report is cached until the donor's next donation.
 
     URL parameter:
     - donor_id (int): The identifier for the donor being queried.
@@ -164,24 +435,60 @@ def report_by_donor(donor_id):
     - HTTP 500: Raised if there is a server-side error such as a database connection issue.
     """
     try:
-        # Get all donations by the donor
-        donations = Donation.query.filter_by(donor_id=donor_id).all()
+        report = _cached_donor_reports([donor_id])[donor_id]
+
+        return jsonify(report), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Failed to generate report by donor',
+            'details': str(e)
+        }), 500
 
-        # Initialize a dictionary to store the donation amounts by type and subtype
-        report = {}
 
-        for donation in donations:
-            subtype = Subtype.query.get(donation.subtype_id)
-            
-            type_name = Type.query.filter_by(type_id=subtype.type_id).first().type_name
-            subtype_name = subtype.subtype_name
-            donation_quantity = donation.donation_quantity
+@report_bp.route('/report/donor/batch', methods=['POST'])
+def report_by_donor_batch():
+    """
+    Generate donor reports for many donors in one request.
 
-            # Update the report dictionary with the donation amounts
-            report.setdefault(type_name, {}).setdefault(subtype_name, 0)
-            report[type_name][subtype_name] += donation_quantity
+    Each report has the same shape as the one returned by /report/donor/<donor_id>.
 
-        return jsonify(report), 200
+    Request format (JSON object):
+    Content-Type: application/json
+    {
+        "donor_ids": [int, ...]   // Identifiers of the donors being queried, at most BATCH_MAX_RECORDS
+    }
+
+    Response format (JSON object keyed by donor ID):
+    {
+        "donor_id": {
+            "type_name": {
+                "subtype_name": donation_quantity,
+                ...
+            },
+            ...
+        },
+        ...
+    }
+    Every requested donor is present; donors without donations map to an empty object.
+
+    Status codes:
+    - 200 OK: Report data was retrieved successfully.
+    - 400 Bad Request: donor_ids is missing, is not a list of integers, or has more than
+      BATCH_MAX_RECORDS entries.
+    - 500 Internal Server Error: A server-side error occurred during report generation.
+    """
+    data = request.get_json(silent=True) or {}
+    donor_ids = data.get("donor_ids")
+    if not isinstance(donor_ids, list) or \
+            not all(isinstance(donor_id, int) and not isinstance(donor_id, bool) for donor_id in donor_ids):
+        return jsonify({'error': 'Invalid data provided'}), 400
+    if len(donor_ids) > current_app.config['BATCH_MAX_RECORDS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_RECORDS']} donor_ids per request"}), 400
+
+    try:
+        reports = _cached_donor_reports(list(dict.fromkeys(donor_ids)))
+        return jsonify({str(donor_id): reports[donor_id] for donor_id in donor_ids}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -189,3 +496,90 @@ def report_by_donor(donor_id):
             'details': str(e)
         }), 500
 
+
+@report_bp.route('/report/timeseries', methods=['GET'])
+def report_timeseries():
+    """
+    Generate donated and distributed totals bucketed by day, week or month.
+
+    The totals are read from the daily rollup table, which is updated together with every
+    donation and distribution, so the raw rows are never scanned.
+
+    Query parameters (all optional):
+    - bucket (str): "day", "week" (starting Monday) or "month". Defaults to "month".
+    - type_id (int): Only subtypes of this type.
+    - subtype_id (int): Only this subtype.
+    - start (str): ISO date; first day included.
+    - end (str): ISO date; last day included.
+
+    Response format (JSON object):
+    {
+        "bucket": "month",
+        "series": [
+            {
+                "period": "2024-01-01",       // First day of the bucket
+                "total_donated": 150,
+                "total_distributed": 100
+            },
+            ...
+        ]
+    }
+    Buckets without any activity are left out.
+
+    On error:
+    {
+        "error": "Failed to generate time series report",
+        "details": "Description of the error"
+    }
+
+    Status codes:
+    - 200 OK: Report data was retrieved successfully.
+    - 400 Bad Request: Unknown bucket, or a malformed date or ID.
+    - 500 Internal Server Error: A server-side error occurred during report generation.
+    """
+    bucket = request.args.get('bucket', 'month')
+    if bucket not in TIMESERIES_BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(TIMESERIES_BUCKETS)}"}), 400
+    try:
+        start = request.args.get('start')
+        start = date.fromisoformat(start) if start else None
+        end = request.args.get('end')
+        end = date.fromisoformat(end) if end else None
+        type_id = request.args.get('type_id')
+        type_id = int(type_id) if type_id else None
+        subtype_id = request.args.get('subtype_id')
+        subtype_id = int(subtype_id) if subtype_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid data provided'}), 400
+
+    try:
+        period = TIMESERIES_BUCKETS[bucket](DailyRollup.day).label('period')
+        query = db.session.query(
+                period,
+                db.func.sum(DailyRollup.total_donated),
+                db.func.sum(DailyRollup.total_distributed))
+        if type_id is not None:
+            query = query.join(Subtype, Subtype.subtype_id == DailyRollup.subtype_id)\
+                .filter(Subtype.type_id == type_id)
+        if subtype_id is not None:
+            query = query.filter(DailyRollup.subtype_id == subtype_id)
+        if start is not None:
+            query = query.filter(DailyRollup.day >= start)
+        if end is not None:
+            query = query.filter(DailyRollup.day <= end)
+
+        series = [
+            {
+                'period': period_start,
+                'total_donated': total_donated,
+                'total_distributed': total_distributed
+            }
+            for period_start, total_donated, total_distributed in query.group_by(period).order_by(period)
+        ]
+        return jsonify({'bucket': bucket, 'series': series}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Failed to generate time series report',
+            'details': str(e)
+        }), 500
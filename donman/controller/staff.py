@@ -1,9 +1,12 @@
 from flask import request, jsonify, session, abort, Blueprint
 from donman.model import Staff
-from werkzeug.security import generate_password_hash, check_password_hash
 from donman.controller import db
+from donman.hashing import HashingBusy, hash_password, needs_rehash, verify_password
+from donman.controller.pagination import PaginationError, Projection, json_response, paginate, prefix_filter, wants_all
 
 staff_bp = Blueprint('staff', __name__)
+
+STAFF_FIELDS = Projection(id=Staff.staff_id, name=Staff.staff_name, email=Staff.staff_email)
  
 @staff_bp.route('/staff', methods=['POST'])
 def register_staff():
@@ -44,6 +47,7 @@ def register_staff():
     - 400 Bad Request: Required data is missing or staff with provided email already exists.
     - 401 Unauthorized: User attempting to register staff is not authenticated.
     - 500 Internal Server Error: A server-side error occurred while registering the staff member.
+    - 503 Service Unavailable: The password hashing pool is saturated; retry later.
 
     Raises:
     - HTTP 401: Raises an HTTP 401 if the user is not authenticated (no 'staff_id' in session).
@@ -66,7 +70,7 @@ def register_staff():
         if existing_staff:
             return jsonify({'error': 'Staff with this email already exists'}), 400
 
-        hashed_password = generate_password_hash(staff_password)
+        hashed_password = hash_password(staff_password)
         new_staff = Staff(
             staff_email=staff_email,
             staff_password_hashed=hashed_password,
@@ -78,6 +82,8 @@ def register_staff():
         db.session.commit()
 
         return jsonify({'message': 'Staff registered successfully', 'staff_id': new_staff.staff_id}), 201
+    except HashingBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503
     except Exception as e:
         return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 
@@ -131,6 +137,8 @@ def login_staff():
 
     This endpoint allows a staff member to log in by providing their email address
     and password. Upon successful authentication, the staff_id is stored in the session.
+    The password is verified in the hashing process pool, and a hash made with an
+    outdated PASSWORD_HASH_METHOD is replaced with a fresh one.
 
     Request format (JSON object):
     Content-Type: application/json
@@ -144,6 +152,7 @@ def login_staff():
     - 200 OK: Logged in successfully.
     - 400 Bad Request: Required data is missing.
     - 401 Unauthorized: Email or password is incorrect, or the staff member does not exist.
+    - 503 Service Unavailable: The password hashing pool is saturated; retry later.
 
     Raises:
     - HTTP 400: Raised if either staff_email or staff_password is missing.
@@ -160,11 +169,17 @@ def login_staff():
             return jsonify(message='Missing email or password'), 400
 
         staff = Staff.query.filter_by(staff_email=staff_email).first()
-        if staff and check_password_hash(staff.staff_password_hashed, staff_password):
+        if staff and verify_password(staff.staff_password_hashed, staff_password):
+            # Transparently upgrade hashes made with an older method or cost
+            if needs_rehash(staff.staff_password_hashed):
+                staff.staff_password_hashed = hash_password(staff_password)
+                db.session.commit()
             session['staff_id'] = staff.staff_id
             return jsonify(message='Login successful'), 200
         else:
             return jsonify(message='Login failed'), 401
+    except HashingBusy:
+        return jsonify(message='Server busy, please retry'), 503
     except Exception as e:
         return jsonify(message='An unexpected error occurred', details=str(e)), 500
 
@@ -208,22 +223,30 @@ def logout_staff():
 @staff_bp.route('/staff', methods=['GET'])
 def get_all_staff():
     """
-    Retrieve a list of all staff members.
+    Retrieve a page of staff members, ordered by staff ID.
 
-    This endpoint returns an array of staff member objects with details like name, 
+    This endpoint returns staff member objects with details like name, 
     email, and other relevant staff information.
 
-    Response format (JSON array):
-    A JSON array of staff member objects containing information for each staff.
-    
-    [
-        {
-            'id': staff_id,
-            'name': staff_name,
-            'email': staff_email
-        }
-        ...
-    ]
+    Query parameters (all optional):
+    - after (int): Return staff with an ID greater than this cursor (default 0).
+    - limit (int): Maximum number of staff members to return.
+    - name (str): Only staff whose name starts with this prefix.
+    - email (str): Only staff whose email starts with this prefix.
+    - all (bool): "true" returns every matching staff member as a plain JSON array instead of a page.
+
+    Response format (JSON object):
+    {
+        "items": [
+            {
+                'id': staff_id,
+                'name': staff_name,
+                'email': staff_email
+            }
+            ...
+        ],
+        "next": staff_id or null  // Pass as ?after= to fetch the next page
+    }
 
     On error (JSON object):
     {
@@ -233,6 +256,7 @@ def get_all_staff():
 
     Status codes:
     - 200 OK: Successfully retrieved the list of staff members.
+    - 400 Bad Request: after or limit is not a valid integer.
     - 500 Internal Server Error: A server-side error occurred while attempting to retrieve staff information.
     
     Raises:
@@ -242,10 +266,13 @@ def get_all_staff():
     try:
         if 'staff_id' not in session:
             abort(401, description='Unauthorized: An authenticated staff user is required.')
-        staff_members = Staff.query.all()
-        # Ensure that each Staff model instance has a method to serialize its information.
-        staff_data = [staff.serialize() for staff in staff_members]
-        return jsonify(staff_data), 200
+        query = prefix_filter(Staff.query, Staff.staff_name, 'name')
+        query = prefix_filter(query, Staff.staff_email, 'email')
+        if wants_all():
+            return json_response(STAFF_FIELDS.stream(query))
+        return json_response(paginate(query, STAFF_FIELDS))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Catch all other unexpected errors
         return jsonify({'error': 'An unexpected error occurred while retrieving staff members', 'details': str(e)}), 500
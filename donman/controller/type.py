@@ -2,33 +2,46 @@
 from flask import Blueprint, request, jsonify, session, abort
 from donman.controller import db
 from donman.model import Type, Subtype
+from donman.controller.pagination import PaginationError, Projection, paginate, prefix_filter, wants_all
+from donman.cache import catalog_response, invalidate_catalog, invalidate_reports
 
 type_bp = Blueprint('type', __name__)
 
+TYPE_FIELDS = Projection(id=Type.type_id, name=Type.type_name)
+SUBTYPE_FIELDS = Projection(id=Subtype.subtype_id, name=Subtype.subtype_name)
+
 @type_bp.route('/type', methods=['GET'])
 def get_types():
     """
-    Retrieve all donation types from the database.
+    Retrieve a page of donation types, ordered by type ID.
 
-    This endpoint returns a list of all the donation types that have been registered.
+    This endpoint returns the donation types that have been registered. Responses are
+    cached in-process until a type or subtype is registered and carry an ETag.
 
-    No parameters required.
+    Query parameters (all optional):
+    - after (int): Return types with an ID greater than this cursor (default 0).
+    - limit (int): Maximum number of types to return.
+    - name (str): Only types whose name starts with this prefix.
+    - all (bool): "true" returns every matching type as a plain JSON array instead of a page.
 
-    Response format (JSON array):
-    A JSON array of serialized type objects each containing type details.
+    Response format (JSON object):
+    A page of serialized type objects each containing type details.
 
     Example response:
-    [
-        {
-            "id": 1,
-            "name": "Food",
-        },
-        {
-            "id": 2,
-            "name": "Clothing",
-        },
-        ...
-    ]
+    {
+        "items": [
+            {
+                "id": 1,
+                "name": "Food",
+            },
+            {
+                "id": 2,
+                "name": "Clothing",
+            },
+            ...
+        ],
+        "next": 2  // Pass as ?after= to fetch the next page, null on the last page
+    }
 
     On error (JSON object):
     {
@@ -38,16 +51,22 @@ def get_types():
 
     Status codes:
     - 200 OK: Donation types information retrieved successfully.
+    - 304 Not Modified: The If-None-Match ETag still matches; no body is sent.
+    - 400 Bad Request: after or limit is not a valid integer.
     - 500 Internal Server Error: A server-side error occurred during the data retrieval process.
 
     Raises:
     - HTTP 500: Raised if there is a server error, such as database connection issues or issues with the query execution.
     """
     try:
-        types = Type.query.all()
-        # Ensure that the 'serialize' method is defined in the Type model and serializes data correctly.
-        type_data = [type.serialize() for type in types]
-        return jsonify(type_data), 200
+        def build():
+            query = prefix_filter(Type.query, Type.type_name, 'name')
+            if wants_all():
+                return TYPE_FIELDS.encode(TYPE_FIELDS.select(query))
+            return paginate(query, TYPE_FIELDS)
+        return catalog_response(build)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 
@@ -97,6 +116,9 @@ def register_type():
         db.session.commit()
         new_subtype = Subtype(type_id=new_type.type_id, subtype_name="other")
         db.session.add(new_subtype)
+        invalidate_catalog()
+        # The type report sums over the type's subtypes
+        invalidate_reports(type_ids=[new_type.type_id])
                 
         db.session.commit()
         return jsonify({'message': 'Type registered successfully', 'type_id': new_type.type_id}), 201
@@ -111,22 +133,28 @@ def get_subtypes():
 
     The type id is provided as a query parameter and is used to fetch the subtypes.
 
-    Query parameter:
+    Query parameters:
     - type_id (int): The identifier for the donation type.
+    - after (int, optional): Return subtypes with an ID greater than this cursor (default 0).
+    - limit (int, optional): Maximum number of subtypes to return.
+    - name (str, optional): Only subtypes whose name starts with this prefix.
+    - all (bool, optional): "true" returns every matching subtype as a plain JSON array instead of a page.
 
-    Response format (JSON array):
-    A JSON array of serialized subtype objects containing subtype details.
-
-    [
-        {
-            'id': subtype_id,
-            'name': subtype_name,
-        }
-    ]
+    Response format (JSON object):
+    {
+        "items": [
+            {
+                'id': subtype_id,
+                'name': subtype_name,
+            }
+        ],
+        "next": subtype_id or null  // Pass as ?after= to fetch the next page
+    }
 
     Status codes:
     - 200 OK: Subtype information retrieved successfully.
-    - 400 Bad Request: Type id is not provided or is invalid.
+    - 304 Not Modified: The If-None-Match ETag still matches; no body is sent.
+    - 400 Bad Request: Type id is not provided or is invalid, or after/limit are not valid integers.
     - 500 Internal Server Error: A server-side error occurred during the retrieval process.
 
     Raises:
@@ -138,9 +166,14 @@ def get_subtypes():
         return jsonify({'error': 'Invalid data provided'}), 400
 
     try:
-        subtypes = Subtype.query.filter(Subtype.type_id == type_id).all()
-        subtypes_data = [subtype.serialize() for subtype in subtypes]
-        return jsonify(subtypes_data), 200
+        def build():
+            query = prefix_filter(Subtype.query.filter(Subtype.type_id == type_id), Subtype.subtype_name, 'name')
+            if wants_all():
+                return SUBTYPE_FIELDS.encode(SUBTYPE_FIELDS.select(query))
+            return paginate(query, SUBTYPE_FIELDS)
+        return catalog_response(build)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Handle any other unexpected exceptions
         return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
@@ -185,7 +218,12 @@ def register_subtype():
     try:
         new_subtype = Subtype(type_id=type_id, subtype_name=subtype_name)
         db.session.add(new_subtype)
+        invalidate_catalog()
+        # The type report sums over the type's subtypes
+        invalidate_reports(type_ids=[type_id])
         db.session.commit()
+        return jsonify({'message': 'Subtype registered successfully', 'subtype_id': new_subtype.subtype_id}), 200
     except Exception as e:
         # Handle any  unexpected exceptions here
+        db.session.rollback()
         return jsonify({'error': 'An unexpected error occurred while registering subtype', 'details': str(e)}), 500
@@ -0,0 +1,156 @@
+"""Bulk donor import with email normalisation and upsert.
+
+Records are validated and deduplicated by normalised email, then written in chunks
+of DONOR_IMPORT_CHUNK rows, one transaction per chunk, with a single executemany of
+``INSERT ... ON CONFLICT (donor_email) DO UPDATE``. A donor that already exists only
+has its name rewritten when it changed, so re-importing an unchanged extract does
+not touch the table. The donor search index is updated for the whole chunk at once
+instead of by its per-row triggers (see donman.search.drop_donor_search_triggers).
+The same function backs ``POST /api/donor/batch`` and ``flask import-donors``.
+"""
+import csv
+import json
+import re
+from sqlalchemy.dialects.sqlite import insert
+from donman.model import db, begin_immediate, Donor
+from donman.search import create_donor_search, drop_donor_search_triggers, ensure_donor_search, index_donors, \
+    unindex_donors
+
+# Rows written per transaction
+DONOR_IMPORT_CHUNK = 5000
+
+# Upper bound on emails per IN (...) clause, well below SQLite's bound-parameter limit
+EMAIL_LOOKUP_CHUNK = 500
+
+DONOR_IMPORT_FORMATS = ('csv', 'ndjson')
+
+# One "@", no whitespace, and a dot in the domain
+_EMAIL = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+
+def normalise_email(value):
+    """
+    Return the canonical form of an email address, or None if it is not one.
+
+    Surrounding whitespace is dropped and the address is lower-cased, so that
+    "Jane@Example.com " and "jane@example.com" are the same donor.
+    """
+    if not isinstance(value, str):
+        return None
+    email = value.strip().lower()
+    return email if _EMAIL.fullmatch(email) else None
+
+
+def _parse(record):
+    """Return (donor_name, donor_email) of a record, or raise ValueError with the reason."""
+    if not isinstance(record, dict):
+        raise ValueError('Record must be an object')
+    name = record.get('donor_name')
+    name = name.strip() if isinstance(name, str) else None
+    if not name:
+        raise ValueError('Missing or invalid donor_name')
+    email = normalise_email(record.get('donor_email'))
+    if email is None:
+        raise ValueError('Missing or invalid donor_email')
+    return name, email
+
+
+def _existing_donors(emails):
+    """Return {donor_email: (donor_id, donor_name)} for the given emails that already exist."""
+    existing = {}
+    for start in range(0, len(emails), EMAIL_LOOKUP_CHUNK):
+        chunk = emails[start:start + EMAIL_LOOKUP_CHUNK]
+        existing.update(
+            (donor_email, (donor_id, donor_name)) for donor_email, donor_id, donor_name
+            in db.session.query(Donor.donor_email, Donor.donor_id, Donor.donor_name)
+            .filter(Donor.donor_email.in_(chunk)))
+    return existing
+
+
+def _changed(rows, existing):
+    return len(existing) < len(rows) or any(existing[email][1] != name for email, name in rows.items())
+
+
+def _write_chunk(rows, counts):
+    """Upsert {email: name} rows in one transaction and add the outcome to counts."""
+    existing = _existing_donors(list(rows))
+    if _changed(rows, existing):
+        # End the read transaction and take the write lock, so no other connection can
+        # change donors between the reads below and the commit
+        db.session.rollback()
+        connection = begin_immediate()
+        ensure_donor_search(connection)
+        drop_donor_search_triggers(connection)
+        try:
+            existing = _existing_donors(list(rows))
+            renamed_ids = [donor_id for email, (donor_id, name) in existing.items() if rows[email] != name]
+            last_id = db.session.query(db.func.max(Donor.donor_id)).scalar() or 0
+            unindex_donors(connection, renamed_ids)
+
+            stmt = insert(Donor)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Donor.donor_email],
+                set_={'donor_name': stmt.excluded.donor_name},
+                where=Donor.donor_name != stmt.excluded.donor_name,
+            )
+            db.session.execute(stmt, [{'donor_email': email, 'donor_name': name} for email, name in rows.items()])
+
+            # New donors got IDs above the previous maximum
+            index_donors(connection, renamed_ids, after_id=last_id)
+        finally:
+            create_donor_search(connection)
+        db.session.commit()
+    else:
+        renamed_ids = []
+        db.session.rollback()
+    counts['inserted'] += len(rows) - len(existing)
+    counts['updated'] += len(renamed_ids)
+    counts['unchanged'] += len(existing) - len(renamed_ids)
+
+
+def import_donors(records, chunk_size=DONOR_IMPORT_CHUNK):
+    """
+    Insert or update donors from an iterable of {"donor_name", "donor_email"} records.
+
+    The first record of each normalised email wins; later ones are rejected as
+    duplicates. Each chunk is committed on its own, so an error leaves the earlier
+    chunks imported.
+
+    Returns (counts, errors): counts has the keys inserted, updated, unchanged and
+    rejected; errors is a list of {"index": int, "error": str} for the rejected records.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+    errors = []
+    seen = {}
+    rows = {}
+    for index, record in enumerate(records):
+        try:
+            name, email = _parse(record)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        if email in seen:
+            errors.append({'index': index, 'error': f'Duplicate of record {seen[email]}'})
+            continue
+        seen[email] = index
+        rows[email] = name
+        if len(rows) >= chunk_size:
+            _write_chunk(rows, counts)
+            rows = {}
+    if rows:
+        _write_chunk(rows, counts)
+    counts['rejected'] = len(errors)
+    return counts, errors
+
+
+def read_records(file, fmt):
+    """Yield donor records from a CSV file with a header row, or from NDJSON lines."""
+    if fmt == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
@@ -0,0 +1,127 @@
+"""Streaming export of the donation and distribution tables.
+
+Rows are read with yield_per so only one batch of plain tuples is held in memory
+at a time, and are encoded into CSV or NDJSON chunks as they arrive. The same
+generators back the /api/export endpoints and the ``flask export`` command.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from donman.model import db, Donation, Distribution
+
+# Rows fetched from the cursor (and encoded into one output chunk) at a time
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+EXPORT_TABLES = {
+    'donations': (
+        Donation.donation_date,
+        Donation.subtype_id,
+        (
+            Donation.donation_id,
+            Donation.donor_id,
+            Donation.staff_id,
+            Donation.subtype_id,
+            Donation.donation_quantity,
+            Donation.donation_date,
+        ),
+    ),
+    'distributions': (
+        Distribution.distribution_date,
+        Distribution.subtype_id,
+        (
+            Distribution.distribution_id,
+            Distribution.staff_id,
+            Distribution.subtype_id,
+            Distribution.distribution_amount,
+            Distribution.distribution_date,
+        ),
+    ),
+}
+
+
+def parse_date_bound(value, inclusive_end=False):
+    """
+    Parse an ISO date or datetime filter value, returning None for empty input.
+
+    A plain date used as an inclusive end bound is moved to the start of the next day
+    so that ``end=2024-12-31`` covers the whole of that day.
+    Raises ValueError for malformed values.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if inclusive_end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def column_names(table):
+    """Return the exported column names of a table."""
+    return [column.key for column in EXPORT_TABLES[table][2]]
+
+
+def iter_rows(table, start=None, end=None, subtype_id=None):
+    """
+    Yield batches of row tuples for the export of a table.
+
+    Rows come in ID order, or in date then ID order when a date bound is given: that
+    is the order of the date index, so SQLite reads just the range from it instead
+    of scanning the whole table in ID order.
+    """
+    date_column, subtype_column, columns = EXPORT_TABLES[table]
+    stmt = db.select(*columns)
+    if start is not None or end is not None:
+        stmt = stmt.order_by(date_column, columns[0])
+    else:
+        stmt = stmt.order_by(columns[0])
+    if start is not None:
+        stmt = stmt.where(date_column >= start)
+    if end is not None:
+        stmt = stmt.where(date_column < end)
+    if subtype_id is not None:
+        stmt = stmt.where(subtype_column == subtype_id)
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(names, batches):
+    """Encode row batches as CSV text chunks, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows([_isoformat(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when no rows matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(names, batches):
+    """Encode row batches as newline-delimited JSON text chunks."""
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(names, (_isoformat(value) for value in row)))) + '\n'
+            for row in batch
+        )
+
+
+def export_chunks(table, fmt, start=None, end=None, subtype_id=None):
+    """Return a generator of encoded text chunks for the export of a table."""
+    batches = iter_rows(table, start=start, end=end, subtype_id=subtype_id)
+    encode = iter_csv if fmt == 'csv' else iter_ndjson
+    return encode(column_names(table), batches)
@@ -0,0 +1,75 @@
+"""Password hashing off the request thread.
+
+Hashing and verifying passwords is deliberately expensive. Running it in a bounded
+pool of worker processes keeps a burst of logins from saturating the request
+workers: the request thread only waits on the result, leaving the CPU and the GIL
+to unrelated requests.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_lock = threading.Lock()
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing pool is saturated for longer than PASSWORD_HASH_TIMEOUT."""
+
+
+class _HashPool:
+    """A process pool with a bound on the number of queued and running jobs."""
+
+    def __init__(self, workers, timeout):
+        # forkserver children start from a clean process rather than a copy of a
+        # multi-threaded request worker
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        self.slots = threading.BoundedSemaphore(workers * 4)
+        self.timeout = timeout
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Password hashing pool is saturated')
+        try:
+            return self.executor.submit(fn, *args).result(timeout=self.timeout)
+        finally:
+            self.slots.release()
+
+
+def _pool():
+    """Return the hashing pool of the current app, or None to hash inline."""
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return None
+    pool = current_app.extensions.get('donman_hash_pool')
+    if pool is None:
+        with _lock:
+            pool = current_app.extensions.get('donman_hash_pool')
+            if pool is None:
+                pool = _HashPool(workers, current_app.config['PASSWORD_HASH_TIMEOUT'])
+                current_app.extensions['donman_hash_pool'] = pool
+    return pool
+
+
+def hash_password(password):
+    """Hash password with the configured PASSWORD_HASH_METHOD."""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    pool = _pool()
+    if pool is None:
+        return generate_password_hash(password, method=method)
+    return pool.run(generate_password_hash, password, method)
+
+
+def verify_password(password_hash, password):
+    """Return True if password matches password_hash."""
+    pool = _pool()
+    if pool is None:
+        return check_password_hash(password_hash, password)
+    return pool.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Return True if password_hash was made with a method or cost other than the configured one."""
+    return password_hash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
@@ -0,0 +1,204 @@
+"""Per-subtype inventory ledger and daily rollup.
+
+The ledger keeps running totals of donated and distributed quantities for every
+subtype so the report endpoints can read a single precomputed row instead of
+summing the whole donation and distribution history on every request. The daily
+rollup keeps the same totals per subtype and calendar day for the time-series
+report.
+
+The record_* helpers only stage upserts on the current session; callers commit
+them together with the Donation/Distribution row they belong to.
+
+With enforced stock, record_distribution instead decrements the ledger balance with
+a single conditional UPDATE that only matches while enough stock remains. SQLite runs
+it under the database write lock, so concurrent distributions cannot both pass the
+check and drive the balance negative.
+"""
+from datetime import date
+from sqlalchemy.dialects.sqlite import insert
+from donman.cache import REPORTS, bump_generation
+from donman.model import db, begin_immediate, Donation, Distribution, SubtypeLedger, DailyRollup
+
+
+class InsufficientStock(Exception):
+    """A distribution asked for more than the remaining stock of its subtype."""
+
+    def __init__(self, subtype_id, amount):
+        super().__init__(f'Insufficient stock for subtype {subtype_id} to distribute {amount}')
+        self.subtype_id = subtype_id
+        self.amount = amount
+
+
+def _apply(subtype_id, donated=0, distributed=0, day=None):
+    """Add the given deltas to the ledger and rollup rows of a subtype, creating them if needed."""
+    _apply_ledger(subtype_id, donated, distributed)
+    _apply_rollup(subtype_id, donated, distributed, day)
+
+
+def _apply_ledger(subtype_id, donated, distributed):
+    stmt = insert(SubtypeLedger).values(
+        subtype_id=subtype_id,
+        total_donated=donated,
+        total_distributed=distributed,
+        remaining_amount=donated - distributed,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SubtypeLedger.subtype_id],
+        set_={
+            'total_donated': SubtypeLedger.total_donated + stmt.excluded.total_donated,
+            'total_distributed': SubtypeLedger.total_distributed + stmt.excluded.total_distributed,
+            'remaining_amount': SubtypeLedger.remaining_amount + stmt.excluded.remaining_amount,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def _apply_rollup(subtype_id, donated, distributed, day):
+    stmt = insert(DailyRollup).values(
+        day=day or date.today(),
+        subtype_id=subtype_id,
+        total_donated=donated,
+        total_distributed=distributed,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyRollup.day, DailyRollup.subtype_id],
+        set_={
+            'total_donated': DailyRollup.total_donated + stmt.excluded.total_donated,
+            'total_distributed': DailyRollup.total_distributed + stmt.excluded.total_distributed,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def record_donation(subtype_id, quantity, day=None):
+    """Stage the ledger and rollup updates for a new donation made on day (default today)."""
+    _apply(subtype_id, donated=quantity, day=day)
+
+
+def record_distribution(subtype_id, amount, day=None, enforce_stock=False):
+    """
+    Stage the ledger and rollup updates for a new distribution made on day (default today).
+
+    With enforce_stock, raise InsufficientStock (leaving the ledger untouched) unless the
+    subtype has at least amount remaining; the caller must then roll back.
+    """
+    if not enforce_stock:
+        _apply(subtype_id, distributed=amount, day=day)
+        return
+    stmt = db.update(SubtypeLedger)\
+        .where(SubtypeLedger.subtype_id == subtype_id, SubtypeLedger.remaining_amount >= amount)\
+        .values(
+            total_distributed=SubtypeLedger.total_distributed + amount,
+            remaining_amount=SubtypeLedger.remaining_amount - amount,
+        )\
+        .execution_options(synchronize_session=False)
+    if db.session.execute(stmt).rowcount != 1:
+        raise InsufficientStock(subtype_id, amount)
+    _apply_rollup(subtype_id, 0, amount, day)
+
+
+def compute_totals():
+    """Aggregate the raw donation and distribution rows into {subtype_id: (donated, distributed)}."""
+    totals = {}
+    donated = db.session.query(Donation.subtype_id, db.func.sum(Donation.donation_quantity))\
+        .group_by(Donation.subtype_id)
+    for subtype_id, total in donated:
+        totals[subtype_id] = (total or 0, 0)
+
+    distributed = db.session.query(Distribution.subtype_id, db.func.sum(Distribution.distribution_amount))\
+        .group_by(Distribution.subtype_id)
+    for subtype_id, total in distributed:
+        totals[subtype_id] = (totals.get(subtype_id, (0, 0))[0], total or 0)
+    return totals
+
+
+def find_drift():
+    """
+    Compare the ledger with the raw rows.
+
+    Returns a list of (subtype_id, ledger_totals, raw_totals) tuples, one per subtype
+    whose ledger row does not match; totals are (donated, distributed, remaining).
+    """
+    raw = {
+        subtype_id: (donated, distributed, donated - distributed)
+        for subtype_id, (donated, distributed) in compute_totals().items()
+    }
+    ledger = {
+        row.subtype_id: (row.total_donated, row.total_distributed, row.remaining_amount)
+        for row in SubtypeLedger.query.all()
+    }
+    drift = []
+    for subtype_id in sorted(raw.keys() | ledger.keys()):
+        expected = raw.get(subtype_id, (0, 0, 0))
+        actual = ledger.get(subtype_id, (0, 0, 0))
+        if expected != actual:
+            drift.append((subtype_id, actual, expected))
+    return drift
+
+
+def rebuild_ledger():
+    """
+    Replace the ledger contents with totals recomputed from the raw rows, and invalidate
+    every cached report. Does not commit.
+
+    Takes the write lock before summing, so no donation or distribution can be
+    committed between the sums and the rewrite; the session must not have a
+    transaction open yet (see model.begin_immediate).
+    """
+    begin_immediate()
+    totals = compute_totals()
+    db.session.query(SubtypeLedger).delete()
+    bump_generation(REPORTS)
+    if totals:
+        db.session.execute(insert(SubtypeLedger), [
+            {
+                'subtype_id': subtype_id,
+                'total_donated': donated,
+                'total_distributed': distributed,
+                'remaining_amount': donated - distributed,
+            }
+            for subtype_id, (donated, distributed) in totals.items()
+        ])
+    return len(totals)
+
+
+def compute_daily_totals():
+    """Aggregate the raw rows into {(day, subtype_id): (donated, distributed)}."""
+    totals = {}
+    donation_day = db.func.date(Donation.donation_date)
+    donated = db.session.query(donation_day, Donation.subtype_id, db.func.sum(Donation.donation_quantity))\
+        .group_by(donation_day, Donation.subtype_id)
+    for day, subtype_id, total in donated:
+        totals[(date.fromisoformat(day), subtype_id)] = (total or 0, 0)
+
+    distribution_day = db.func.date(Distribution.distribution_date)
+    distributed = db.session.query(distribution_day, Distribution.subtype_id,
+                                   db.func.sum(Distribution.distribution_amount))\
+        .group_by(distribution_day, Distribution.subtype_id)
+    for day, subtype_id, total in distributed:
+        key = (date.fromisoformat(day), subtype_id)
+        totals[key] = (totals.get(key, (0, 0))[0], total or 0)
+    return totals
+
+
+def rebuild_rollup():
+    """
+    Replace the daily rollup with totals recomputed from the raw rows. Does not commit.
+
+    Like rebuild_ledger, takes the write lock before summing; the session must not
+    have a transaction open yet.
+    """
+    begin_immediate()
+    totals = compute_daily_totals()
+    db.session.query(DailyRollup).delete()
+    if totals:
+        db.session.execute(insert(DailyRollup), [
+            {
+                'day': day,
+                'subtype_id': subtype_id,
+                'total_donated': donated,
+                'total_distributed': distributed,
+            }
+            for (day, subtype_id), (donated, distributed) in totals.items()
+        ])
+    return len(totals)
@@ -0,0 +1,287 @@
+"""Per-endpoint request metrics in Prometheus text format.
+
+Every request updates in-memory counters keyed by route, method and status code:
+request count, a latency histogram, and the number and total duration of SQL
+statements it ran (measured with SQLAlchemy engine events). Each worker process
+periodically writes its cumulative totals to ``METRICS_DIR/<pid>-<token>.json``, the
+token telling apart processes that reuse a pid; the metrics endpoint adds up the
+files of all processes, so the numbers cover every worker. The hit and miss counters
+of the app's caches are written and added up the same way.
+
+When ``flask serve`` reaps a worker, retire_process folds the worker's totals into
+``METRICS_DIR/retired.json`` and deletes its file, so counters keep growing across
+worker restarts instead of being summed from ever more files.
+"""
+import json
+import os
+import pathlib
+import re
+import secrets
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from donman.model import db
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Totals of exited processes, and the names of the process files already folded into it
+RETIRED = 'retired.json'
+
+# Name of a process's file: <pid>-<token>.json, or <pid>.json from earlier versions
+_PROCESS_FILE = re.compile(r'(\d+)(?:-[0-9a-f]+)?\.json')
+
+
+def _merge(merged, caches, snapshot):
+    """Add the series and cache counters of one snapshot to merged and caches."""
+    for label, (hits, misses) in snapshot['caches'].items():
+        total = caches.setdefault(label, [0, 0])
+        total[0] += hits
+        total[1] += misses
+    for key, entry in snapshot['series']:
+        key = tuple(key)
+        total = merged.get(key)
+        if total is None:
+            merged[key] = entry
+            continue
+        for name in ('count', 'sum', 'statements', 'db_seconds'):
+            total[name] += entry[name]
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+
+
+def _read(path):
+    """Return the snapshot in path, or None if it is missing or unreadable."""
+    try:
+        snapshot = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    # Files of a version without cache counters hold a bare list
+    return snapshot if isinstance(snapshot, dict) else None
+
+
+def _write(path, snapshot):
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(snapshot))
+    os.replace(tmp, path)
+
+
+def retire_process(directory, pid=None):
+    """
+    Fold the totals of an exited process into RETIRED and delete its file.
+
+    With pid None, retire the files of every process that is no longer running, e.g.
+    those left behind by a previous run. Only the supervisor calls this; the process
+    must not write its file any more.
+    """
+    directory = pathlib.Path(directory)
+    paths = []
+    for path in directory.glob('*.json'):
+        match = _PROCESS_FILE.fullmatch(path.name)
+        if match is None:
+            continue
+        if pid is not None:
+            if int(match.group(1)) == pid:
+                paths.append(path)
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+        except ProcessLookupError:
+            paths.append(path)
+        except PermissionError:
+            pass  # running under another user
+    if not paths:
+        return
+
+    retired = _read(directory / RETIRED) or {'series': [], 'caches': {}, 'folded': []}
+    merged, caches = {}, {}
+    _merge(merged, caches, retired)
+    for path in paths:
+        snapshot = _read(path)
+        if snapshot is not None and path.name not in retired['folded']:
+            _merge(merged, caches, snapshot)
+    # Readers skip the folded files, so until they are deleted below nothing is counted
+    # twice; names of files already gone are dropped
+    folded = [name for name in retired['folded'] if (directory / name).exists()]
+    folded += [path.name for path in paths if path.name not in folded]
+    _write(directory / RETIRED, {
+        'series': [[list(key), entry] for key, entry in merged.items()],
+        'caches': caches,
+        'folded': folded,
+    })
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+class MetricsStore:
+    """Cumulative per-(route, method, status) counters of one process."""
+
+    def __init__(self, directory, flush_seconds):
+        self.directory = pathlib.Path(directory)
+        self.flush_seconds = flush_seconds
+        self.series = {}
+        # Caches by label, each with hits and misses attributes (see donman.cache)
+        self.caches = {}
+        self.last_flush = time.monotonic()
+        # This process's file, named on its first flush (a forked worker gets its own)
+        self._pid = None
+        self._path = None
+        self._lock = threading.Lock()
+        # Serializes writers of this process's file, which all use the same temp name
+        self._flush_lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, statements, db_seconds):
+        key = (route, method, str(status))
+        with self._lock:
+            entry = self.series.get(key)
+            if entry is None:
+                entry = self.series[key] = {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS),
+                    'statements': 0, 'db_seconds': 0.0,
+                }
+            entry['count'] += 1
+            entry['sum'] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+                    break
+            entry['statements'] += statements
+            entry['db_seconds'] += db_seconds
+            # Only the thread that finds the flush due writes the file
+            due = time.monotonic() - self.last_flush >= self.flush_seconds
+            if due:
+                self.last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Atomically write this process's totals to its file."""
+        with self._flush_lock:
+            with self._lock:
+                self.last_flush = time.monotonic()
+                snapshot = json.dumps({
+                    'series': [[list(key), entry] for key, entry in self.series.items()],
+                    'caches': {label: [cache.hits, cache.misses] for label, cache in self.caches.items()},
+                })
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._path = self.directory / f'{self._pid}-{secrets.token_hex(4)}.json'
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self._path.with_suffix('.tmp')
+            tmp.write_text(snapshot)
+            os.replace(tmp, self._path)
+
+    def collect(self):
+        """
+        Return the totals of all processes, merged: ({(route, method, status): entry},
+        {cache label: [hits, misses]}).
+        """
+        self.flush()
+        merged = {}
+        caches = {}
+        retired = _read(self.directory / RETIRED)
+        folded = set()
+        if retired is not None:
+            _merge(merged, caches, retired)
+            folded = set(retired['folded'])
+        for path in self.directory.glob('*.json'):
+            if not _PROCESS_FILE.fullmatch(path.name) or path.name in folded:
+                continue
+            snapshot = _read(path)
+            if snapshot is not None:
+                _merge(merged, caches, snapshot)
+        return merged, caches
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(route, method, status, **extra):
+    pairs = {'route': route, 'method': method, 'status': status, **extra}
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs.items()) + '}'
+
+
+def render(merged, caches):
+    """Render merged totals and cache counters in the Prometheus text exposition format."""
+    lines = [
+        '# HELP donman_http_requests_total Requests handled, by route, method and status.',
+        '# TYPE donman_http_requests_total counter',
+    ]
+    for key, entry in sorted(merged.items()):
+        lines.append(f'donman_http_requests_total{_labels(*key)} {entry["count"]}')
+
+    lines += [
+        '# HELP donman_http_request_duration_seconds Request latency until the response is returned.',
+        '# TYPE donman_http_request_duration_seconds histogram',
+    ]
+    for key, entry in sorted(merged.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+            cumulative += count
+            lines.append(f'donman_http_request_duration_seconds_bucket{_labels(*key, le=bound)} {cumulative}')
+        lines.append(f'donman_http_request_duration_seconds_bucket{_labels(*key, le="+Inf")} {entry["count"]}')
+        lines.append(f'donman_http_request_duration_seconds_sum{_labels(*key)} {entry["sum"]}')
+        lines.append(f'donman_http_request_duration_seconds_count{_labels(*key)} {entry["count"]}')
+
+    lines += [
+        '# HELP donman_db_statements_total SQL statements executed while handling requests.',
+        '# TYPE donman_db_statements_total counter',
+    ]
+    for key, entry in sorted(merged.items()):
+        lines.append(f'donman_db_statements_total{_labels(*key)} {entry["statements"]}')
+
+    lines += [
+        '# HELP donman_db_seconds_total Time spent executing SQL statements while handling requests.',
+        '# TYPE donman_db_seconds_total counter',
+    ]
+    for key, entry in sorted(merged.items()):
+        lines.append(f'donman_db_seconds_total{_labels(*key)} {entry["db_seconds"]}')
+
+    for index, (name, description) in enumerate((('hits', 'served from'), ('misses', 'not found in'))):
+        lines += [
+            f'# HELP donman_cache_{name}_total Lookups {description} a cache, by cache.',
+            f'# TYPE donman_cache_{name}_total counter',
+        ]
+        for label, counts in sorted(caches.items()):
+            lines.append(f'donman_cache_{name}_total{{cache="{_escape(label)}"}} {counts[index]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Install the request hooks and engine events that feed the app's metrics store."""
+    store = MetricsStore(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+    app.extensions['donman_metrics'] = store
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_db_seconds = 0.0
+
+    @app.after_request
+    def record(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            try:
+                store.observe(route, request.method, response.status_code, time.perf_counter() - start,
+                              g.pop('metrics_statements', 0), g.pop('metrics_db_seconds', 0.0))
+            except Exception:
+                # Losing a metrics flush must not fail the request it measured
+                app.logger.exception('Failed to record request metrics')
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_query_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('metrics_query_start', None)
+        if start is not None and has_request_context() and 'metrics_start' in g:
+            g.metrics_statements += 1
+            g.metrics_db_seconds += time.perf_counter() - start
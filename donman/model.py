@@ -30,7 +30,7 @@ class Donor(db.Model):
     __tablename__ = 'donor'
     donor_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     donor_email = db.Column(db.Text, unique=True, nullable=False)
-    donor_name = db.Column(db.Text, nullable=False)
+    donor_name = db.Column(db.Text, nullable=False, index=True)
     def serialize(self):
         """Return donor data in serialized format"""
         return {
@@ -43,7 +43,7 @@ class Staff(db.Model):
     staff_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     staff_email = db.Column(db.Text, unique=True, nullable=False)
     staff_password_hashed = db.Column(db.Text, nullable=False)
-    staff_name = db.Column(db.Text, nullable=False)
+    staff_name = db.Column(db.Text, nullable=False, index=True)
     staff_created_by_staff_id = db.Column(db.Integer, db.ForeignKey('staff.staff_id'), nullable=True)
     staff_deleted_by_staff_id = db.Column(db.Boolean)
     __table_args__ = (
@@ -69,7 +69,14 @@ class Donation(db.Model):
     __table_args__ = (
         db.ForeignKeyConstraint(['donor_id'], ['donor.donor_id']),
         db.ForeignKeyConstraint(['staff_id'], ['staff.staff_id']),
-        db.ForeignKeyConstraint(['subtype_id'], ['subtype.subtype_id'])
+        db.ForeignKeyConstraint(['subtype_id'], ['subtype.subtype_id']),
+        # Covers the per-subtype SUM used to rebuild and check the ledger, and the
+        # all-time donor leaderboard of a type
+        db.Index('ix_donation_subtype_quantity', 'subtype_id', 'donation_quantity', 'donor_id'),
+        # Covers the donor report: lookup by donor, grouped by subtype
+        db.Index('ix_donation_donor_subtype', 'donor_id', 'subtype_id', 'donation_quantity'),
+        # Date-range exports; also covers the donor leaderboard of a month or year
+        db.Index('ix_donation_date_donor', 'donation_date', 'donor_id', 'subtype_id', 'donation_quantity'),
     )
 
 class Distribution(db.Model):
@@ -81,5 +88,55 @@ class Distribution(db.Model):
     distribution_amount = db.Column(db.Integer, nullable=False)
     __table_args__ = (
         db.ForeignKeyConstraint(['staff_id'], ['staff.staff_id']),
-        db.ForeignKeyConstraint(['subtype_id'], ['subtype.subtype_id'])
-    )
\ No newline at end of file
+        db.ForeignKeyConstraint(['subtype_id'], ['subtype.subtype_id']),
+        # Covers the per-subtype SUM used to rebuild and check the ledger
+        db.Index('ix_distribution_subtype_amount', 'subtype_id', 'distribution_amount'),
+        # Date-range exports
+        db.Index('ix_distribution_date', 'distribution_date'),
+    )
+
+class SubtypeLedger(db.Model):
+    __tablename__ = 'subtype_ledger'
+    subtype_id = db.Column(db.Integer, db.ForeignKey('subtype.subtype_id'), primary_key=True)
+    total_donated = db.Column(db.Integer, nullable=False, default=0)
+    total_distributed = db.Column(db.Integer, nullable=False, default=0)
+    remaining_amount = db.Column(db.Integer, nullable=False, default=0)
+    def serialize(self):
+        """Return ledger data in serialized format"""
+        return {
+            'total_donated': self.total_donated,
+            'total_distributed': self.total_distributed,
+            'remaining_amount': self.remaining_amount,
+        }
+
+
+class DailyRollup(db.Model):
+    __tablename__ = 'daily_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    subtype_id = db.Column(db.Integer, db.ForeignKey('subtype.subtype_id'), primary_key=True)
+    total_donated = db.Column(db.Integer, nullable=False, default=0)
+    total_distributed = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_daily_rollup_subtype_day', 'subtype_id', 'day'),
+    )
+
+
+class WriteGeneration(db.Model):
+    __tablename__ = 'write_generation'
+    name = db.Column(db.Text, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+
+def begin_immediate():
+    """
+    Start the session's transaction with BEGIN IMMEDIATE and return its connection.
+
+    pysqlite only opens a transaction before INSERT/UPDATE/DELETE, so reads and DDL
+    issued before the first write run outside of it, each committed on its own. This
+    takes SQLite's write lock up front instead: what the following reads see cannot
+    change until commit, and DDL is rolled back with the rest. The session must not
+    have a transaction open yet.
+    """
+    connection = db.session.connection()
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+    return connection
@@ -0,0 +1,90 @@
+"""Slow-query log and N+1 detector for development and staging.
+
+Enabled with QUERY_DEBUG in the config. Statements slower than SLOW_QUERY_MS are
+logged with their bound parameters and the view that ran them, and a request that
+runs the same normalised statement more than N_PLUS_ONE_THRESHOLD times is flagged
+as a likely N+1 query loop.
+
+``max_queries`` is a helper for tests and benchmarks that fails when a block of code
+runs more statements than its budget.
+"""
+import contextlib
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from donman.model import db
+
+_IN_LIST = re.compile(r'IN \((?:\?|%s|:\w+)(?:, ?(?:\?|%s|:\w+))*\)', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalise(statement):
+    """Reduce a statement to its shape: literals and IN lists collapsed, whitespace squeezed."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _IN_LIST.sub('IN (...)', statement)
+    return _LITERAL.sub('?', statement)
+
+
+def init_querylog(app):
+    """Install the engine events and request hooks of the slow-query log and N+1 detector."""
+    slow_seconds = app.config['SLOW_QUERY_MS'] / 1000
+    threshold = app.config['N_PLUS_ONE_THRESHOLD']
+
+    @app.before_request
+    def start_counting():
+        g.querylog_counts = Counter()
+
+    @app.after_request
+    def flag_repeats(response):
+        counts = g.pop('querylog_counts', None)
+        for statement, count in (counts or {}).items():
+            if count > threshold:
+                app.logger.warning('Possible N+1 in %s (%s %s): %d executions of %s',
+                                   request.endpoint, request.method, request.path, count, statement)
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['querylog_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('querylog_start', None)
+        elapsed = time.perf_counter() - start if start is not None else 0.0
+        view = request.endpoint if has_request_context() else None
+        if elapsed > slow_seconds:
+            app.logger.warning('Slow query (%.1f ms) in %s: %s; parameters=%r',
+                               elapsed * 1000, view or '<no request>', statement, parameters)
+        if view is not None and 'querylog_counts' in g:
+            g.querylog_counts[normalise(statement)] += 1
+
+
+@contextlib.contextmanager
+def max_queries(app, budget):
+    """
+    Fail with AssertionError if the block runs more than budget SQL statements.
+
+        with max_queries(app, 3):
+            client.get('/api/report/donor/1')
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    if len(statements) > budget:
+        listing = '\n'.join(f'  {normalise(statement)}' for statement in statements)
+        raise AssertionError(f'{len(statements)} queries run, budget is {budget}:\n{listing}')
@@ -0,0 +1,182 @@
+"""Full-text donor search backed by an SQLite FTS5 table.
+
+``donor_fts`` is an external-content FTS5 index over ``donor.donor_name`` and
+``donor.donor_email``: it stores only the index, reads the text back from the donor
+table, and is kept in sync by triggers on that table. It is created together with
+the donor table by ``db.create_all()``; on an existing database create or re-sync it
+with ``flask rebuild-donor-search``. It is not part of the SQLAlchemy metadata, so
+migrations leave it alone (see include_object).
+"""
+import re
+from sqlalchemy import event, text
+from donman.model import db, Donor
+
+DONOR_FTS_DDL = (
+    # prefix='2 3 4 5 6' keeps a ready-merged doclist for every 2 to 6 character
+    # prefix. Without it a prefix query merges the doclists of every matching term,
+    # and unique email tokens such as "smith12" make those prefixes match thousands.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS donor_fts USING fts5(
+        donor_name, donor_email,
+        content='donor', content_rowid='donor_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')""",
+    """CREATE TRIGGER IF NOT EXISTS donor_fts_insert AFTER INSERT ON donor BEGIN
+        INSERT INTO donor_fts(rowid, donor_name, donor_email)
+        VALUES (new.donor_id, new.donor_name, new.donor_email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donor_fts_delete AFTER DELETE ON donor BEGIN
+        INSERT INTO donor_fts(donor_fts, rowid, donor_name, donor_email)
+        VALUES ('delete', old.donor_id, old.donor_name, old.donor_email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donor_fts_update AFTER UPDATE ON donor BEGIN
+        INSERT INTO donor_fts(donor_fts, rowid, donor_name, donor_email)
+        VALUES ('delete', old.donor_id, old.donor_name, old.donor_email);
+        INSERT INTO donor_fts(rowid, donor_name, donor_email)
+        VALUES (new.donor_id, new.donor_name, new.donor_email);
+    END""",
+)
+
+DONOR_FTS_TRIGGERS = ('donor_fts_insert', 'donor_fts_delete', 'donor_fts_update')
+
+# The FTS table and the shadow tables FTS5 creates for it (donor_fts_data, _idx,
+# _docsize, _config)
+DONOR_FTS_TABLE = 'donor_fts'
+
+# Upper bound on IDs per IN (...) clause, well below SQLite's bound-parameter limit
+ID_CHUNK = 500
+
+# FTS5 computes rank (bm25 by default) for every match and returns the :limit best,
+# so the results are the most relevant donors even for a common word ("john",
+# "gmail"), not the best among the oldest matches.
+SEARCH_SQL = text("""
+    SELECT donor.donor_id, donor.donor_email, donor.donor_name
+    FROM (
+        SELECT rowid AS donor_id, rank
+        FROM donor_fts
+        WHERE donor_fts MATCH :query
+        ORDER BY rank
+        LIMIT :limit
+    ) AS hit
+    JOIN donor ON donor.donor_id = hit.donor_id
+    ORDER BY hit.rank, donor.donor_id
+""")
+
+# Characters the unicode61 tokenizer keeps inside a token
+_TOKEN = re.compile(r'\w+')
+
+
+def create_donor_search(connection):
+    """Create the FTS table and its triggers if they do not exist yet."""
+    for statement in DONOR_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def ensure_donor_search(connection):
+    """
+    Create the FTS table and its triggers and index every donor, unless the table exists.
+
+    A database upgraded through migrations has no FTS table until ``flask
+    rebuild-donor-search`` runs; bulk writers call this first so their index updates
+    have a table to go to. Run it inside the writer's transaction.
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (DONOR_FTS_TABLE,)).first()
+    if exists is None:
+        create_donor_search(connection)
+        connection.exec_driver_sql("INSERT INTO donor_fts(donor_fts) VALUES ('rebuild')")
+
+
+@event.listens_for(Donor.__table__, 'after_create')
+def _create_with_donor_table(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_donor_search(connection)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Alembic autogenerate filter that skips the FTS tables.
+
+    They exist in the database but not in the metadata, so ``flask db migrate``
+    would otherwise propose dropping them.
+    """
+    if type_ == 'table' and reflected and compare_to is None:
+        return not (name == DONOR_FTS_TABLE or name.startswith(DONOR_FTS_TABLE + '_'))
+    return True
+
+
+def drop_donor_search_triggers(connection):
+    """
+    Drop the sync triggers for a bulk write to the donor table.
+
+    FTS5 flushes its pending index data at every statement savepoint, which makes
+    per-row trigger inserts several times slower than indexing the rows in one
+    statement. Bulk writers drop the triggers, keep the index in step with
+    unindex_donors/index_donors and restore the triggers with create_donor_search,
+    all in one transaction started with model.begin_immediate: pysqlite does not
+    open a transaction before DDL, so without it the DROP commits at once and
+    donors written by other connections meanwhile are never indexed. Inside the
+    transaction the write lock keeps other writers out until the triggers are back,
+    and a rollback restores them.
+    """
+    for trigger in DONOR_FTS_TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+
+
+def _in_chunks(connection, sql, donor_ids):
+    donor_ids = list(donor_ids)
+    for start in range(0, len(donor_ids), ID_CHUNK):
+        chunk = donor_ids[start:start + ID_CHUNK]
+        connection.exec_driver_sql(sql.format(ids=', '.join('?' * len(chunk))), tuple(chunk))
+
+
+def unindex_donors(connection, donor_ids):
+    """Remove the index entries of the given donors, as currently stored."""
+    _in_chunks(connection, """
+        INSERT INTO donor_fts(donor_fts, rowid, donor_name, donor_email)
+        SELECT 'delete', donor_id, donor_name, donor_email FROM donor WHERE donor_id IN ({ids})
+    """, donor_ids)
+
+
+def index_donors(connection, donor_ids=(), after_id=None):
+    """Index the given donors, and every donor with an ID above after_id if it is given."""
+    _in_chunks(connection, """
+        INSERT INTO donor_fts(rowid, donor_name, donor_email)
+        SELECT donor_id, donor_name, donor_email FROM donor WHERE donor_id IN ({ids})
+    """, donor_ids)
+    if after_id is not None:
+        connection.exec_driver_sql("""
+            INSERT INTO donor_fts(rowid, donor_name, donor_email)
+            SELECT donor_id, donor_name, donor_email FROM donor WHERE donor_id > ?
+        """, (after_id,))
+
+
+def rebuild_donor_search():
+    """Create the FTS table if needed and re-index every donor. Does not commit."""
+    connection = db.session.connection()
+    create_donor_search(connection)
+    connection.exec_driver_sql("INSERT INTO donor_fts(donor_fts) VALUES ('rebuild')")
+    return db.session.query(Donor).count()
+
+
+def match_query(q):
+    """
+    Turn free text into an FTS5 query matching donors that have every word as a prefix.
+
+    Each word is quoted, so FTS5 operators in the input are searched for literally.
+    Returns None if q contains no searchable word.
+    """
+    words = _TOKEN.findall(q)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_donors(q, limit):
+    """Return up to limit serialized donors matching q, best match first."""
+    query = match_query(q)
+    if query is None:
+        return []
+    rows = db.session.execute(SEARCH_SQL, {'query': query, 'limit': limit})
+    return [
+        {'id': donor_id, 'email': donor_email, 'name': donor_name}
+        for donor_id, donor_email, donor_name in rows
+    ]
@@ -0,0 +1,167 @@
+"""Deterministic synthetic data for scale testing.
+
+Rows are generated as plain tuples and written with executemany through the Core
+connection in large transactions; the secondary indexes on the donation and
+distribution tables are dropped during the load and rebuilt once at the end, and
+the ledger and daily rollup are recomputed from the loaded rows.
+
+The data is skewed like real intake: donor and subtype popularity follow a Zipf
+distribution (a few heavy donors and popular subtypes), quantities are heavy-tailed,
+and dates are denser in the year-end giving season and on weekdays.
+"""
+import itertools
+import random
+from datetime import date, timedelta
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from donman.cache import invalidate_catalog, invalidate_donations
+from donman.ledger import rebuild_ledger, rebuild_rollup
+from donman.model import db, Donation, Distribution, Donor, Staff, Subtype, Type
+
+# Rows per executemany call, and rows per committed transaction
+INSERT_CHUNK = 50000
+COMMIT_EVERY = 1000000
+
+# Relative donation volume per month (January first)
+MONTH_WEIGHTS = (0.8, 0.7, 0.8, 0.8, 0.9, 0.9, 0.8, 0.8, 1.0, 1.1, 1.6, 2.2)
+
+SEED_PASSWORD = "password"
+
+
+def _zipf_cum_weights(count, exponent=1.1):
+    """Cumulative weights making rank 1 the most likely of count choices."""
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def _day_cum_weights(years):
+    """Days of the last years years and their cumulative seasonal weights."""
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in range(years * 365)]
+    weights = [MONTH_WEIGHTS[day.month - 1] * (0.6 if day.weekday() >= 5 else 1.0) for day in days]
+    return [day.isoformat() for day in days], list(itertools.accumulate(weights))
+
+
+def _timestamps(rng, days, day_weights, count):
+    """Return count timestamps in SQLAlchemy's SQLite DateTime storage format."""
+    picked = rng.choices(days, cum_weights=day_weights, k=count)
+    return [
+        f"{day} {rng.randint(8, 19):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}.000000"
+        for day in picked
+    ]
+
+
+def _quantities(rng, count, cap):
+    """Return count heavy-tailed positive quantities no larger than cap."""
+    return [min(cap, int(rng.paretovariate(1.3))) for _ in range(count)]
+
+
+def _insert(connection, table, columns, rows):
+    """Insert row tuples with a single executemany."""
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    connection.exec_driver_sql(sql, rows)
+
+
+def _next_id(column):
+    """Return the ID the next inserted row of column's table will get."""
+    return (db.session.query(db.func.max(column)).scalar() or 0) + 1
+
+
+def seed_database(donors, donations, distributions=None, types=10, subtypes_per_type=5,
+                  staff=10, years=3, random_seed=0, progress=None):
+    """
+    Generate and insert synthetic rows into the current app's database.
+
+    distributions defaults to a quarter of donations. Names and emails embed
+    random_seed, so seeding twice with the same seed fails on the unique constraints.
+    progress, if given, is called with (table, rows_inserted_so_far).
+    Returns a dict of inserted row counts.
+    """
+    rng = random.Random(random_seed)
+    if distributions is None:
+        distributions = donations // 4
+    report = progress or (lambda table, count: None)
+    connection = db.session.connection()
+
+    first_staff = _next_id(Staff.staff_id)
+    password_hash = generate_password_hash(SEED_PASSWORD, method=current_app.config['PASSWORD_HASH_METHOD'])
+    _insert(connection, Staff.__table__, ('staff_email', 'staff_password_hashed', 'staff_name'), [
+        (f"staff{i}.seed{random_seed}@example.com", password_hash, f"Seed Staff {i}") for i in range(staff)])
+
+    first_type = _next_id(Type.type_id)
+    _insert(connection, Type.__table__, ('type_name',), [
+        (f"seed{random_seed} type {i}",) for i in range(types)])
+    first_subtype = _next_id(Subtype.subtype_id)
+    _insert(connection, Subtype.__table__, ('type_id', 'subtype_name'), [
+        (first_type + t, f"subtype {s}") for t in range(types) for s in range(subtypes_per_type)])
+    invalidate_catalog()
+
+    first_donor = _next_id(Donor.donor_id)
+    for start in range(0, donors, INSERT_CHUNK):
+        _insert(connection, Donor.__table__, ('donor_email', 'donor_name'), [
+            (f"donor{i}.seed{random_seed}@example.com", f"Donor {i}")
+            for i in range(start, min(donors, start + INSERT_CHUNK))])
+    db.session.commit()
+    connection = db.session.connection()
+    report('donor', donors)
+
+    staff_ids = range(first_staff, first_staff + staff)
+    subtype_ids = range(first_subtype, first_subtype + types * subtypes_per_type)
+    donor_ids = range(first_donor, first_donor + donors)
+    subtype_weights = _zipf_cum_weights(len(subtype_ids))
+    donor_weights = _zipf_cum_weights(len(donor_ids))
+    days, day_weights = _day_cum_weights(years)
+
+    # Build the indexes once after the load instead of maintaining them row by row
+    indexed_tables = (Donation.__table__, Distribution.__table__)
+    for table in indexed_tables:
+        for index in table.indexes:
+            index.drop(connection, checkfirst=True)
+    try:
+        for start in range(0, donations, INSERT_CHUNK):
+            count = min(INSERT_CHUNK, donations - start)
+            _insert(connection, Donation.__table__,
+                    ('donor_id', 'staff_id', 'subtype_id', 'donation_quantity', 'donation_date'),
+                    list(zip(rng.choices(donor_ids, cum_weights=donor_weights, k=count),
+                             rng.choices(staff_ids, k=count),
+                             rng.choices(subtype_ids, cum_weights=subtype_weights, k=count),
+                             _quantities(rng, count, 500),
+                             _timestamps(rng, days, day_weights, count))))
+            if (start + count) % COMMIT_EVERY == 0 or start + count == donations:
+                db.session.commit()
+                connection = db.session.connection()
+                report('donation', start + count)
+
+        for start in range(0, distributions, INSERT_CHUNK):
+            count = min(INSERT_CHUNK, distributions - start)
+            _insert(connection, Distribution.__table__,
+                    ('staff_id', 'subtype_id', 'distribution_amount', 'distribution_date'),
+                    list(zip(rng.choices(staff_ids, k=count),
+                             rng.choices(subtype_ids, cum_weights=subtype_weights, k=count),
+                             _quantities(rng, count, 200),
+                             _timestamps(rng, days, day_weights, count))))
+            if (start + count) % COMMIT_EVERY == 0 or start + count == distributions:
+                db.session.commit()
+                connection = db.session.connection()
+                report('distribution', start + count)
+    finally:
+        db.session.rollback()
+        connection = db.session.connection()
+        for table in indexed_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        db.session.commit()
+
+    # Each rebuild starts its own write transaction
+    rebuild_ledger()
+    db.session.commit()
+    rebuild_rollup()
+    invalidate_donations(*{date.fromisoformat(day).replace(day=1) for day in days})
+    db.session.commit()
+    return {
+        'staff': staff,
+        'type': types,
+        'subtype': types * subtypes_per_type,
+        'donor': donors,
+        'donation': donations,
+        'distribution': distributions,
+    }
@@ -0,0 +1,186 @@
+"""Pre-forking production server.
+
+The supervisor binds one listening socket and forks worker processes that all
+accept from it. Workers share nothing: each one drops the database connections
+inherited from the supervisor and opens its own after the fork. Crashed workers
+are replaced; SIGTERM or SIGINT stops the workers gracefully: a worker stops
+accepting and waits up to the graceful timeout for its in-flight requests to finish
+before it exits.
+"""
+import os
+import signal
+import socket
+import threading
+import time
+from werkzeug.serving import BaseWSGIServer, ThreadedWSGIServer
+from donman.model import db
+
+# A worker that dies sooner than this after starting delays its replacement,
+# so a broken deployment does not fork in a tight loop
+MIN_WORKER_UPTIME = 1.0
+
+
+class DrainingWSGIServer(ThreadedWSGIServer):
+    """
+    Threaded server that counts its in-flight requests, so shutdown can wait for them.
+
+    werkzeug runs request threads as daemon threads and never joins them, so without
+    this the worker's exit would cut off every request still being handled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        # Counted in the accepting thread, so a request accepted before shutdown()
+        # returns is always waited for
+        with self._idle:
+            self._in_flight += 1
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._finished()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._finished()
+
+    def _finished(self):
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def drain(self, timeout):
+        """Wait until no request is in flight; return False if timeout ran out first."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+
+def _run_worker(app, sock, threaded, graceful_timeout):
+    """Serve requests from the shared socket until SIGTERM; runs in the forked child."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when to stop
+    with app.app_context():
+        # Forget the supervisor's pooled connections without closing them
+        db.engine.dispose(close=False)
+
+    server_class = DrainingWSGIServer if threaded else BaseWSGIServer
+    server = server_class(sock.getsockname()[0], sock.getsockname()[1], app, fd=sock.fileno())
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    serving = threading.Thread(target=server.serve_forever, daemon=True)
+    serving.start()
+    stopping.wait()
+    # Stop accepting; an unthreaded server returns once its current request is done
+    server.shutdown()
+    if threaded and not server.drain(graceful_timeout):
+        server.log('warning', 'Requests still in flight after %ss; exiting anyway', graceful_timeout)
+    server.server_close()
+    # Write the last totals, which the supervisor folds into the retired metrics
+    metrics = app.extensions.get('donman_metrics')
+    if metrics is not None:
+        metrics.flush()
+
+
+class Supervisor:
+    """Fork, watch and restart the worker processes."""
+
+    def __init__(self, app, host, port, workers, threaded=True, graceful_timeout=30, log=print):
+        self.app = app
+        self.workers = workers
+        self.threaded = threaded
+        self.graceful_timeout = graceful_timeout
+        self.log = log
+        self.children = {}
+        self.stopping = False
+        self.sock = socket.create_server((host, port), backlog=2048)
+        self.sock.set_inheritable(True)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _run_worker(self.app, self.sock, self.threaded, self.graceful_timeout)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.children[pid] = time.monotonic()
+
+    def retire(self, pid=None):
+        """Fold the metrics of a reaped worker (or of every exited process) into the retired totals."""
+        if not self.app.config['METRICS_ENABLED']:
+            return
+        from donman.metrics import retire_process
+        try:
+            retire_process(self.app.config['METRICS_DIR'], pid)
+        except OSError as e:
+            self.log(f"Could not retire the metrics of {'worker ' + str(pid) if pid else 'exited processes'}: {e}")
+
+    def stop(self, signum, frame):
+        # waitpid is retried after the handler returns, so wake it up by stopping
+        # the workers here rather than only setting the flag
+        self.stopping = True
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        host, port = self.sock.getsockname()[:2]
+        self.log(f"Serving on http://{host}:{port} with {self.workers} worker(s) (supervisor pid {os.getpid()})")
+        # Files left by the workers of a previous run
+        self.retire()
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            self.retire(pid)
+            if self.stopping:
+                continue
+            self.log(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                time.sleep(MIN_WORKER_UPTIME)
+            self.spawn()
+
+        self.shutdown()
+
+    def shutdown(self):
+        """Ask every worker to stop, then kill the ones still running after the timeout."""
+        self.log("Shutting down workers...")
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                if self.children.pop(pid, None) is not None:
+                    self.retire(pid)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            self.log(f"Worker {pid} did not stop in time; killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.retire(pid)
+        self.sock.close()
@@ -0,0 +1,146 @@
+"""Columnar snapshots of the donation and distribution tables for offline analytics.
+
+A snapshot is a directory holding one raw binary file per column and table, written
+with the ``array`` module in native byte order, so it can be memory-mapped and read
+without parsing (see donman.analytics):
+
+    snapshot.json                 manifest: row counts, column type codes, byte order
+    donations/<column>.bin        donation_id, donor_id, staff_id, subtype_id, quantity, date
+    distributions/<column>.bin    distribution_id, staff_id, subtype_id, quantity, date
+    subtypes.json                 subtype dictionary: ID -> subtype name, type ID and name
+    donors.ndjson                 donor dictionary: one [donor_id, donor_name] per line
+
+Dates are seconds since the epoch of the stored (naive) timestamps; a missing donor
+or staff reference is stored as 0. All tables are read in one explicit read
+transaction, so the snapshot is consistent, and rows are streamed with yield_per so
+memory use does not grow with the table size.
+"""
+import json
+import shutil
+import sys
+from array import array
+from datetime import datetime
+from pathlib import Path
+from donman.model import db, Donation, Distribution, Donor, Subtype, Type
+
+SNAPSHOT_FORMAT = 1
+
+# Rows fetched from the cursor (and appended to the column files) at a time
+SNAPSHOT_BATCH_SIZE = 50000
+
+MANIFEST = 'snapshot.json'
+SUBTYPES = 'subtypes.json'
+DONORS = 'donors.ndjson'
+
+
+def _epoch(column):
+    return db.cast(db.func.strftime('%s', column), db.Integer)
+
+
+def _id(column):
+    return db.func.coalesce(column, 0)
+
+
+# Per table: [(column name, array type code, selected expression), ...]; the first
+# column is the primary key and gives the row order
+SNAPSHOT_TABLES = {
+    'donations': [
+        ('donation_id', 'q', Donation.donation_id),
+        ('donor_id', 'q', _id(Donation.donor_id)),
+        ('staff_id', 'i', _id(Donation.staff_id)),
+        ('subtype_id', 'i', _id(Donation.subtype_id)),
+        ('quantity', 'q', Donation.donation_quantity),
+        ('date', 'q', _epoch(Donation.donation_date)),
+    ],
+    'distributions': [
+        ('distribution_id', 'q', Distribution.distribution_id),
+        ('staff_id', 'i', _id(Distribution.staff_id)),
+        ('subtype_id', 'i', _id(Distribution.subtype_id)),
+        ('quantity', 'q', Distribution.distribution_amount),
+        ('date', 'q', _epoch(Distribution.distribution_date)),
+    ],
+}
+
+
+def _write_table(directory, table, progress):
+    columns = SNAPSHOT_TABLES[table]
+    directory.mkdir()
+    files = [open(directory / f'{name}.bin', 'wb') for name, _, _ in columns]
+    rows = 0
+    try:
+        stmt = db.select(*(expression for _, _, expression in columns)).order_by(columns[0][2])
+        result = db.session.execute(stmt.execution_options(yield_per=SNAPSHOT_BATCH_SIZE))
+        for batch in result.partitions():
+            for file, (_, typecode, _), values in zip(files, columns, zip(*batch)):
+                array(typecode, values).tofile(file)
+            rows += len(batch)
+            progress(table, rows)
+    finally:
+        for file in files:
+            file.close()
+    return {
+        'rows': rows,
+        'columns': {name: {'typecode': typecode, 'itemsize': array(typecode).itemsize}
+                    for name, typecode, _ in columns},
+    }
+
+
+def _write_dictionaries(directory):
+    # Read from the tables rather than the cached catalog, inside the snapshot's transaction
+    types = dict(db.session.query(Type.type_id, Type.type_name))
+    subtypes = [
+        {'subtype_id': subtype_id, 'subtype_name': subtype_name,
+         'type_id': type_id, 'type_name': types.get(type_id)}
+        for subtype_id, type_id, subtype_name
+        in db.session.query(Subtype.subtype_id, Subtype.type_id, Subtype.subtype_name).order_by(Subtype.subtype_id)
+    ]
+    (directory / SUBTYPES).write_text(json.dumps(subtypes))
+
+    with open(directory / DONORS, 'w', encoding='utf-8') as file:
+        stmt = db.select(Donor.donor_id, Donor.donor_name).order_by(Donor.donor_id)
+        result = db.session.execute(stmt.execution_options(yield_per=SNAPSHOT_BATCH_SIZE))
+        for batch in result.partitions():
+            file.write(''.join(json.dumps([donor_id, donor_name]) + '\n' for donor_id, donor_name in batch))
+
+
+def write_snapshot(directory, progress=None):
+    """
+    Write a snapshot of all tables to directory, replacing any snapshot already there.
+
+    The snapshot is assembled next to directory and moved into place when complete.
+    progress, if given, is called with (table, rows_written_so_far).
+    Returns the manifest. The session must not have a transaction open yet.
+    """
+    directory = Path(directory)
+    report = progress or (lambda table, rows: None)
+    staging = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        # pysqlite does not open a transaction for SELECTs, so each one would read
+        # the latest commit; an explicit BEGIN makes every read see the same state
+        db.session.connection().exec_driver_sql('BEGIN')
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'byteorder': sys.byteorder,
+            'tables': {table: _write_table(staging / table, table, report) for table in SNAPSHOT_TABLES},
+            'dictionaries': {'subtypes': SUBTYPES, 'donors': DONORS},
+        }
+        _write_dictionaries(staging)
+        (staging / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        db.session.rollback()
+
+    if directory.exists():
+        previous = directory.with_name(directory.name + '.old')
+        shutil.rmtree(previous, ignore_errors=True)
+        directory.rename(previous)
+        staging.rename(directory)
+        shutil.rmtree(previous)
+    else:
+        staging.rename(directory)
+    return manifest